@@ -1,4 +1,18 @@
 from pyqubits.quantumstate import QuantumState
+from pyqubits.batch import QuantumStateBatch
+from pyqubits.circuit import Circuit
+from pyqubits.mps import MPSState
+from pyqubits.sparse import SparseState
+from pyqubits.noise import (
+    NoiseModel,
+    Depolarizing,
+    AmplitudeDamping,
+    ReadoutError,
+    simulate_trajectories,
+)
+from pyqubits.runner import run_shots
+from pyqubits.gradients import gradient
+from pyqubits.kernels import warmup
 from pyqubits.gates import (
     zero_matrix,
     one_matrix,
@@ -16,4 +30,10 @@ from pyqubits.gates import (
     CP,
     CT,
     f2,
+    SWAP,
+    Unitary,
+    RX,
+    RY,
+    RZ,
+    U3,
 )
@@ -0,0 +1,406 @@
+import math
+import numpy as np
+from pyqubits.utils import (
+    PyQubitsError,
+    validate_qubits,
+    validate_dtype,
+    validate_qubit_list,
+    validate_angles,
+)
+from pyqubits.fusion import to_phase, f2_op, phase_arrays, permutation_args
+from pyqubits.quantumstate import QuantumState
+from pyqubits.kernels import (
+    apply_single_batch,
+    apply_double_batch,
+    apply_matrix_batch,
+    apply_controlled_batch,
+    apply_flip_batch,
+    apply_swap_batch,
+    apply_phases_batch,
+    probabilities_batch,
+    collapse_batch,
+)
+from pyqubits.gates import (
+    Y,
+    Z,
+    H,
+    P,
+    T,
+    CY,
+    CZ,
+    CH,
+    CP,
+    CT,
+    Unitary,
+    RX,
+    RY,
+    RZ,
+    U3,
+)
+
+
+class QuantumStateBatch:
+    """
+    A class for simulating a batch of multi-qubit states at once.
+
+    The states are stored as the rows of a (K, 2**n) array, and every gate is applied to all of them in a single kernel.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_num_classical_states",
+        "_state_vectors",
+        "_bits",
+    )
+
+    def __init__(self, n: int = 1, k: int = 1, dtype=None):
+        if (not isinstance(n, int)) or n < 1:
+            raise PyQubitsError("'n' must be a positive integer")
+        if (not isinstance(k, int)) or k < 1:
+            raise PyQubitsError("'k' must be a positive integer")
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
+        self._num_qubits = n
+        self._num_classical_states = 2**self._num_qubits
+        # Each state vector is created with random values from the unit circle around the origin
+        shape = (k, self._num_classical_states)
+        self._state_vectors = (2 * np.random.random(shape) - 1) + (
+            2 * np.random.random(shape) - 1
+        ) * 1j  # complex128
+        # The vectors are normalised
+        self._state_vectors /= np.linalg.norm(self._state_vectors, axis=1)[:, None]
+        self._state_vectors = self._state_vectors.astype(dtype, copy=False)
+        self._bits = None
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype=None):
+        """
+        Construct a `QuantumStateBatch` object from a 2D array (or list of lists), with one state vector per row.
+        The vectors are normalised to ensure they are valid states.
+        """
+        if not isinstance(vectors, np.ndarray) and not isinstance(vectors, list):
+            raise PyQubitsError("'vectors' must be either a NumPy array or a list")
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
+        state_vectors = np.array(vectors, dtype=dtype)
+        if state_vectors.ndim != 2 or len(state_vectors) == 0:
+            raise PyQubitsError("'vectors' must contain one or more vectors of equal length")
+        length = state_vectors.shape[1]
+        if length <= 1 or int(math.log2(length)) != math.log2(length):
+            raise PyQubitsError(
+                "The vectors' length must be greater than one, and can only be a power of two"
+            )
+        obj = cls(dtype=dtype)
+        obj._num_qubits = int(math.log2(length))
+        obj._num_classical_states = length
+        obj._state_vectors = state_vectors / np.linalg.norm(state_vectors, axis=1)[:, None]
+        obj._bits = None
+        return obj
+
+    @classmethod
+    def from_states(cls, states, dtype=None):
+        """
+        Construct a `QuantumStateBatch` object from a list of `QuantumState` objects, with the same number of qubits.
+        By default, the batch has the precision of the states (or double precision, if their precisions differ).
+        """
+        if not isinstance(states, list) or not all(
+            isinstance(s, QuantumState) for s in states
+        ):
+            raise PyQubitsError("'states' must be a list of QuantumState objects")
+        if dtype is None and len(states) > 0:
+            dtype = np.result_type(*[s.dtype for s in states])
+        return cls.from_vectors([s.vector for s in states], dtype=dtype)
+
+    @classmethod
+    def from_bits(cls, bits, dtype=None):
+        """
+        Construct a `QuantumStateBatch` object from a list of binary number strings, with one state per string.
+        """
+        if not isinstance(bits, list) or len(bits) == 0:
+            raise PyQubitsError("'bits' must be a non-empty list of binary number strings")
+        return cls.from_states(
+            [QuantumState.from_bits(b, dtype=dtype) for b in bits], dtype=dtype
+        )
+
+    def __len__(self):
+        return len(self._state_vectors)
+
+    def __getitem__(self, index: int):
+        """
+        A `QuantumState` copy of the state at `index` within the batch, with the same precision as the batch.
+        """
+        return QuantumState.from_vector(
+            self._state_vectors[index], dtype=self._state_vectors.dtype
+        )
+
+    def __repr__(self):
+        return (
+            "QuantumStateBatch("
+            + f"\n{' ' * (len('QuantumStateBatch(') - len('array('))}".join(
+                repr(self._state_vectors)[len("array(") : -1].split("\n")
+            )
+            + ")"
+        )
+
+    @property
+    def vectors(self):
+        """
+        NumPy array of the state vectors, with one state per row.
+        """
+        return self._state_vectors
+
+    @property
+    def dtype(self):
+        """
+        NumPy dtype of the state vectors (either complex64 or complex128).
+        """
+        return self._state_vectors.dtype
+
+    @property
+    def bits(self):
+        """
+        NumPy array of the outcomes of the latest measurement of each state.
+        """
+        return self._bits
+
+    def _apply_permutation(self, op):
+        # Gates that only permute the basis states (flips and swaps) are applied by swapping amplitudes
+        kernel = apply_flip_batch if op[0] == "flip" else apply_swap_batch
+        kernel(self._state_vectors, *permutation_args(op, self._num_qubits))
+
+    def _execute(self, op):
+        kind, qubits, gate = to_phase(op)
+        if kind == "phase":
+            # Diagonal gates only multiply each amplitude by a phase, as for a single state
+            apply_phases_batch(
+                self._state_vectors,
+                *phase_arrays(gate, self._num_qubits, self._state_vectors.dtype),
+            )
+            return
+        gate = np.asarray(gate, dtype=self._state_vectors.dtype)
+        bits = tuple(self._num_qubits - qubit for qubit in qubits)
+        if kind == "cgate":
+            apply_controlled_batch(self._state_vectors, gate, *bits)
+        elif len(qubits) == 1:
+            apply_single_batch(self._state_vectors, gate, *bits)
+        elif len(qubits) == 2:
+            apply_double_batch(self._state_vectors, gate, *bits)
+        else:
+            apply_matrix_batch(self._state_vectors, gate, *bits)
+
+    def _apply_gate(self, *args, gate):
+        self._execute(("gate", args, gate))
+
+    def _apply_cgate(self, control, target, gate):
+        self._execute(("cgate", (control, target), gate))
+
+    def _apply_measure(self, qubit):
+        bit_position = self._num_qubits - qubit
+        # Determine probabilities for each measurement, for every state
+        norms = probabilities_batch(self._state_vectors, bit_position)
+        decimal_places = QuantumState.decimal_places
+        if self._state_vectors.dtype == np.complex64:
+            # Single precision states cannot be rounded as accurately as double precision states
+            decimal_places = min(decimal_places, np.finfo(np.float32).precision + 1)
+        zero_probabilities = np.round(norms[:, 0] / norms.sum(axis=1), decimal_places)
+        # Choose an outcome for every state, then collapse (and normalise) them all in place
+        bits = (np.random.random(len(norms)) > zero_probabilities).astype(np.int64)
+        scales = 1 / np.sqrt(norms[np.arange(len(norms)), bits])
+        collapse_batch(self._state_vectors, bit_position, bits, scales)
+        self._bits = bits
+
+    @validate_qubits
+    def measure(self, qubit: int):
+        """
+        Measure a `qubit` within every quantum state.
+        """
+        self._apply_measure(qubit)
+        return self
+
+    @validate_qubits
+    def X(self, qubit: int):
+        """
+        Apply the X gate to a `qubit` within every quantum state.
+        """
+        self._apply_permutation(("flip", (qubit,), 1))
+        return self
+
+    @validate_qubits
+    def Y(self, qubit: int):
+        """
+        Apply the Y gate to a `qubit` within every quantum state.
+        """
+        self._apply_gate(qubit, gate=Y.matrix())
+        return self
+
+    @validate_qubits
+    def Z(self, qubit: int):
+        """
+        Apply the Z gate to a `qubit` within every quantum state.
+        """
+        self._apply_gate(qubit, gate=Z.matrix())
+        return self
+
+    @validate_qubits
+    def H(self, qubit: int):
+        """
+        Apply the H gate to a `qubit` within every quantum state.
+        """
+        self._apply_gate(qubit, gate=H.matrix())
+        return self
+
+    @validate_qubits
+    def P(self, qubit: int):
+        """
+        Apply the P gate to a `qubit` within every quantum state.
+        """
+        self._apply_gate(qubit, gate=P.matrix())
+        return self
+
+    @validate_qubits
+    def T(self, qubit: int):
+        """
+        Apply the T gate to a `qubit` within every quantum state.
+        """
+        self._apply_gate(qubit, gate=T.matrix())
+        return self
+
+    @validate_qubits
+    def RX(self, qubit: int, theta: float):
+        """
+        Apply the RX gate (a rotation by `theta` radians around the X axis) to a `qubit` within every quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RX.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RY(self, qubit: int, theta: float):
+        """
+        Apply the RY gate (a rotation by `theta` radians around the Y axis) to a `qubit` within every quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RY.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RZ(self, qubit: int, theta: float):
+        """
+        Apply the RZ gate (a rotation by `theta` radians around the Z axis) to a `qubit` within every quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RZ.matrix(theta))
+        return self
+
+    @validate_qubits
+    def U3(self, qubit: int, theta: float, phi: float, lam: float):
+        """
+        Apply the U3 gate (a general single qubit rotation, by the angles `theta`, `phi` and `lam`) to a `qubit` within every quantum state.
+        """
+        validate_angles(theta, phi, lam)
+        self._apply_gate(qubit, gate=U3.matrix(theta, phi, lam))
+        return self
+
+    @validate_qubits
+    def CNOT(self, control: int, target: int):
+        """
+        Apply the CNOT (controlled-X) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_permutation(("flip", (control, target), 1))
+        return self
+
+    @validate_qubits
+    def CY(self, control: int, target: int):
+        """
+        Apply the CY (controlled-Y) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CY.matrix())
+        return self
+
+    @validate_qubits
+    def CZ(self, control: int, target: int):
+        """
+        Apply the CZ (controlled-Z) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CZ.matrix())
+        return self
+
+    @validate_qubits
+    def CH(self, control: int, target: int):
+        """
+        Apply the CH (controlled-H) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CH.matrix())
+        return self
+
+    @validate_qubits
+    def CP(self, control: int, target: int):
+        """
+        Apply the CP (controlled-P) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CP.matrix())
+        return self
+
+    @validate_qubits
+    def CT(self, control: int, target: int):
+        """
+        Apply the CT (controlled-T) gate to a `control` qubit and `target` qubit within every quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CT.matrix())
+        return self
+
+    @validate_qubits
+    def f2(self, qubit1: int, qubit2: int, f: str):
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+        if not f in ["const0", "const1", "bal0", "bal1"]:
+            raise PyQubitsError(f"invalid choice of 'f'")
+
+        # The const0 oracle is the identity, so nothing is applied
+        if f != "const0":
+            self._apply_permutation(f2_op(f, qubit1, qubit2))
+        return self
+
+    @validate_qubits
+    def SWAP(self, qubit1: int, qubit2: int):
+        """
+        Apply the SWAP gate to `qubit1` and `qubit2` within every quantum state.
+        """
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+
+        self._apply_permutation(("swap", (qubit1, qubit2), None))
+        return self
+
+    def apply_unitary(self, matrix, qubits):
+        """
+        Apply a custom gate, given by a unitary `matrix` (or an already validated `Unitary` gate), to a list of `qubits` within every quantum state.
+
+        The qubits can be in any order, and need not be adjacent, with the first as the most significant qubit of the matrix.
+        """
+        if not isinstance(matrix, Unitary):
+            matrix = Unitary(matrix)
+        validate_qubit_list(qubits, self._num_qubits)
+        if len(qubits) != matrix.num_qubits:
+            raise PyQubitsError(
+                "'matrix' must act on the same number of qubits as given"
+            )
+
+        self._apply_gate(*qubits, gate=matrix.matrix())
+        return self
@@ -0,0 +1,469 @@
+import numpy as np
+from pyqubits.utils import (
+    PyQubitsError,
+    validate_qubits,
+    validate_dtype,
+    validate_qubit_list,
+    validate_angles,
+)
+from pyqubits.fusion import fuse, f2_op, phase_arrays, permutation_args
+from pyqubits.kernels import (
+    apply_single,
+    apply_double,
+    apply_matrix,
+    apply_controlled,
+    apply_flip,
+    apply_swap,
+    apply_phases,
+    apply_single_batch,
+    apply_double_batch,
+    apply_matrix_batch,
+    apply_controlled_batch,
+    apply_flip_batch,
+    apply_swap_batch,
+    apply_phases_batch,
+)
+from pyqubits.quantumstate import QuantumState
+from pyqubits.batch import QuantumStateBatch
+from pyqubits.gates import (
+    Y,
+    Z,
+    H,
+    P,
+    T,
+    CY,
+    CZ,
+    CH,
+    CP,
+    CT,
+    Unitary,
+    RX,
+    RY,
+    RZ,
+    U3,
+)
+
+
+# The kernel used in place of each (single state) kernel, when running on a batch of states
+_batch_kernels = {
+    apply_single: apply_single_batch,
+    apply_double: apply_double_batch,
+    apply_matrix: apply_matrix_batch,
+    apply_controlled: apply_controlled_batch,
+    apply_flip: apply_flip_batch,
+    apply_swap: apply_swap_batch,
+    apply_phases: apply_phases_batch,
+}
+
+
+class Circuit:
+    """
+    A class for recording a sequence of quantum operations, which can be run on many quantum states.
+
+    The circuit is compiled once (fusing gates and precomputing the kernel for each operation), and reused on every run.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_ops",
+        "_parameters",
+        "_compiled",
+    )
+
+    def __init__(self, n: int = 1):
+        if (not isinstance(n, int)) or n < 1:
+            raise PyQubitsError("'n' must be a positive integer")
+        self._num_qubits = n
+        # Each recorded operation is paired with the entry used to log it on a state's circuit
+        self._ops = []
+        # The gate and angles of each operation that is a rotation gate (and None for any other operation)
+        self._parameters = []
+        # The compiled circuit, for each precision it has been run with
+        self._compiled = {}
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _record(self, op, name, a, b=0, parameters=None):
+        self._ops.append((op, (name, a, b)))
+        self._parameters.append(parameters)
+        # The circuit has changed, so must be compiled again
+        self._compiled = {}
+
+    @property
+    def parameters(self):
+        """
+        The angles of every rotation gate in the circuit, in the order they were added.
+        """
+        return np.asarray(
+            [
+                angle
+                for parameters in self._parameters
+                if parameters is not None
+                for angle in parameters[1]
+            ],
+            dtype=np.float64,
+        )
+
+    @parameters.setter
+    def parameters(self, values):
+        values = list(values)
+        if len(values) != len(self.parameters):
+            raise PyQubitsError(
+                "'parameters' must contain an angle for every parameter of the circuit"
+            )
+        validate_angles(*values)
+        for i, parameters in enumerate(self._parameters):
+            if parameters is None:
+                continue
+            gate, angles = parameters
+            angles, values = tuple(values[: len(angles)]), values[len(angles) :]
+            (kind, qubits, _), entry = self._ops[i]
+            self._ops[i] = ((kind, qubits, gate.matrix(*angles)), entry)
+            self._parameters[i] = (gate, angles)
+        # The circuit has changed, so must be compiled again
+        self._compiled = {}
+
+    def _compile_gates(self, ops, dtype):
+        plan = []
+        for kind, qubits, matrix in fuse(ops):
+            if kind in ("flip", "swap"):
+                plan.append(
+                    (
+                        apply_flip if kind == "flip" else apply_swap,
+                        permutation_args((kind, qubits, matrix), self._num_qubits),
+                    )
+                )
+                continue
+            if kind == "phase":
+                plan.append(
+                    (apply_phases, phase_arrays(matrix, self._num_qubits, dtype))
+                )
+                continue
+            matrix = np.ascontiguousarray(matrix, dtype=dtype)
+            bits = tuple(self._num_qubits - qubit for qubit in qubits)
+            if kind == "cgate":
+                plan.append((apply_controlled, (matrix,) + bits))
+            elif len(qubits) == 1:
+                plan.append((apply_single, (matrix,) + bits))
+            elif len(qubits) == 2:
+                plan.append((apply_double, (matrix,) + bits))
+            else:
+                plan.append((apply_matrix, (matrix,) + bits))
+        return plan
+
+    def compile(self, dtype="complex128"):
+        """
+        Fuse the gates of the circuit, and precompute the kernel, matrix and qubit positions of each operation.
+
+        The gate matrices are stored with the precision (`dtype`) of the states the circuit will be run on.
+        This is done automatically when the circuit is first run on states of that precision (or first run after being changed).
+        """
+        dtype = validate_dtype(dtype)
+        plan = []
+        gates = []
+        for op, _ in self._ops:
+            if op[0] == "measure":
+                # Gates cannot be fused across a measurement
+                plan.extend(self._compile_gates(gates, dtype))
+                gates = []
+                plan.append((None, op[1]))
+            else:
+                gates.append(op)
+        plan.extend(self._compile_gates(gates, dtype))
+        self._compiled[dtype] = plan
+        return self
+
+    def _plan(self, dtype):
+        if dtype not in self._compiled:
+            self.compile(dtype)
+        return self._compiled[dtype]
+
+    def _run_state(self, state):
+        # Run the circuit on a `QuantumState`, and return the bit from each measurement
+        state._flush()
+        measured = []
+        for kernel, args in self._plan(state._state_vector.dtype):
+            if kernel is None:
+                state._apply_measure(*args)
+                measured.append(state._bit)
+            else:
+                state._run_kernel(kernel, *args)
+        return measured
+
+    def run(self, state):
+        """
+        Run the circuit on a `state`, which can be a `QuantumState`, a `QuantumStateBatch` or a vector (a NumPy array or a list).
+
+        A `QuantumState` or `QuantumStateBatch` is updated in place and returned.
+        A vector is left unchanged, and the resulting vector is returned instead.
+        """
+        if isinstance(state, QuantumState):
+            if state._num_qubits != self._num_qubits:
+                raise PyQubitsError(
+                    "The state must have the same number of qubits as the circuit"
+                )
+            measured = iter(self._run_state(state))
+            # Log each operation on the state's circuit, as if it had been applied directly
+            for op, (name, a, b) in self._ops:
+                if op[0] == "measure":
+                    b = next(measured)
+                state._record(name, a, b)
+            return state
+        if isinstance(state, QuantumStateBatch):
+            if state._num_qubits != self._num_qubits:
+                raise PyQubitsError(
+                    "The states must have the same number of qubits as the circuit"
+                )
+            for kernel, args in self._plan(state._state_vectors.dtype):
+                if kernel is None:
+                    state._apply_measure(*args)
+                else:
+                    _batch_kernels[kernel](state._state_vectors, *args)
+            return state
+        if not isinstance(state, np.ndarray) and not isinstance(state, list):
+            raise PyQubitsError(
+                "'state' must be either a QuantumState, a QuantumStateBatch, a NumPy array or a list"
+            )
+        if len(state) != 2**self._num_qubits:
+            raise PyQubitsError(
+                "The vector's length must be two to the power of the number of qubits in the circuit"
+            )
+        # Single precision vectors keep their precision, anything else is run in double precision
+        dtype = "complex64" if np.asarray(state).dtype == np.complex64 else "complex128"
+        vector = np.array(state, dtype=dtype)
+        for kernel, args in self._plan(vector.dtype):
+            if kernel is None:
+                raise PyQubitsError(
+                    "A circuit containing measurements can only be run on a QuantumState"
+                )
+            kernel(vector, *args)
+        return vector
+
+    @validate_qubits
+    def measure(self, qubit: int):
+        """
+        Measure a `qubit` within the circuit.
+        """
+        self._record(("measure", (qubit,), None), "measure", qubit)
+        return self
+
+    @validate_qubits
+    def X(self, qubit: int):
+        """
+        Apply the X gate to a `qubit` within the circuit.
+        """
+        self._record(("flip", (qubit,), 1), "X", qubit)
+        return self
+
+    @validate_qubits
+    def Y(self, qubit: int):
+        """
+        Apply the Y gate to a `qubit` within the circuit.
+        """
+        self._record(("gate", (qubit,), Y.matrix()), "Y", qubit)
+        return self
+
+    @validate_qubits
+    def Z(self, qubit: int):
+        """
+        Apply the Z gate to a `qubit` within the circuit.
+        """
+        self._record(("gate", (qubit,), Z.matrix()), "Z", qubit)
+        return self
+
+    @validate_qubits
+    def H(self, qubit: int):
+        """
+        Apply the H gate to a `qubit` within the circuit.
+        """
+        self._record(("gate", (qubit,), H.matrix()), "H", qubit)
+        return self
+
+    @validate_qubits
+    def P(self, qubit: int):
+        """
+        Apply the P gate to a `qubit` within the circuit.
+        """
+        self._record(("gate", (qubit,), P.matrix()), "P", qubit)
+        return self
+
+    @validate_qubits
+    def T(self, qubit: int):
+        """
+        Apply the T gate to a `qubit` within the circuit.
+        """
+        self._record(("gate", (qubit,), T.matrix()), "T", qubit)
+        return self
+
+    @validate_qubits
+    def RX(self, qubit: int, theta: float):
+        """
+        Apply the RX gate (a rotation by `theta` radians around the X axis) to a `qubit` within the circuit.
+        """
+        validate_angles(theta)
+        self._record(
+            ("gate", (qubit,), RX.matrix(theta)),
+            "RX",
+            qubit,
+            parameters=(RX, (theta,)),
+        )
+        return self
+
+    @validate_qubits
+    def RY(self, qubit: int, theta: float):
+        """
+        Apply the RY gate (a rotation by `theta` radians around the Y axis) to a `qubit` within the circuit.
+        """
+        validate_angles(theta)
+        self._record(
+            ("gate", (qubit,), RY.matrix(theta)),
+            "RY",
+            qubit,
+            parameters=(RY, (theta,)),
+        )
+        return self
+
+    @validate_qubits
+    def RZ(self, qubit: int, theta: float):
+        """
+        Apply the RZ gate (a rotation by `theta` radians around the Z axis) to a `qubit` within the circuit.
+        """
+        validate_angles(theta)
+        self._record(
+            ("gate", (qubit,), RZ.matrix(theta)),
+            "RZ",
+            qubit,
+            parameters=(RZ, (theta,)),
+        )
+        return self
+
+    @validate_qubits
+    def U3(self, qubit: int, theta: float, phi: float, lam: float):
+        """
+        Apply the U3 gate (a general single qubit rotation, by the angles `theta`, `phi` and `lam`) to a `qubit` within the circuit.
+        """
+        validate_angles(theta, phi, lam)
+        self._record(
+            ("gate", (qubit,), U3.matrix(theta, phi, lam)),
+            "U3",
+            qubit,
+            parameters=(U3, (theta, phi, lam,)),
+        )
+        return self
+
+    @validate_qubits
+    def CNOT(self, control: int, target: int):
+        """
+        Apply the CNOT (controlled-X) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(("flip", (control, target), 1), "CNOT", control, target)
+        return self
+
+    @validate_qubits
+    def CY(self, control: int, target: int):
+        """
+        Apply the CY (controlled-Y) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(
+            ("cgate", (control, target), CY.matrix()), "CY", control, target
+        )
+        return self
+
+    @validate_qubits
+    def CZ(self, control: int, target: int):
+        """
+        Apply the CZ (controlled-Z) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(
+            ("cgate", (control, target), CZ.matrix()), "CZ", control, target
+        )
+        return self
+
+    @validate_qubits
+    def CH(self, control: int, target: int):
+        """
+        Apply the CH (controlled-H) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(
+            ("cgate", (control, target), CH.matrix()), "CH", control, target
+        )
+        return self
+
+    @validate_qubits
+    def CP(self, control: int, target: int):
+        """
+        Apply the CP (controlled-P) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(
+            ("cgate", (control, target), CP.matrix()), "CP", control, target
+        )
+        return self
+
+    @validate_qubits
+    def CT(self, control: int, target: int):
+        """
+        Apply the CT (controlled-T) gate to a `control` qubit and `target` qubit within the circuit.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._record(
+            ("cgate", (control, target), CT.matrix()), "CT", control, target
+        )
+        return self
+
+    @validate_qubits
+    def f2(self, qubit1: int, qubit2: int, f: str):
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+        if not f in ["const0", "const1", "bal0", "bal1"]:
+            raise PyQubitsError(f"invalid choice of 'f'")
+
+        self._record(f2_op(f, qubit1, qubit2), "f2", qubit1, qubit2)
+        return self
+
+    @validate_qubits
+    def SWAP(self, qubit1: int, qubit2: int):
+        """
+        Apply the SWAP gate to `qubit1` and `qubit2` within the circuit.
+        """
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+
+        self._record(("swap", (qubit1, qubit2), None), "SWAP", qubit1, qubit2)
+        return self
+
+    def apply_unitary(self, matrix, qubits):
+        """
+        Apply a custom gate, given by a unitary `matrix` (or an already validated `Unitary` gate), to a list of `qubits` within the circuit.
+
+        The qubits can be in any order, and need not be adjacent, with the first as the most significant qubit of the matrix.
+        """
+        if not isinstance(matrix, Unitary):
+            matrix = Unitary(matrix)
+        validate_qubit_list(qubits, self._num_qubits)
+        if len(qubits) != matrix.num_qubits:
+            raise PyQubitsError(
+                "'matrix' must act on the same number of qubits as given"
+            )
+
+        self._record(
+            ("gate", tuple(qubits), matrix.matrix()), "U", min(qubits), max(qubits)
+        )
+        return self
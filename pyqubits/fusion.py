@@ -0,0 +1,156 @@
+import numpy as np
+
+
+# Operations are tuples of the form (kind, qubits, matrix):
+# - ("gate", (qubit,), matrix) applies a 2x2 matrix to a qubit
+# - ("gate", (qubit1, qubit2), matrix) applies a 4x4 matrix to two qubits, with qubit1 as the most significant
+# - ("cgate", (control, target), matrix) applies a 2x2 matrix to the target qubit, controlled by the control qubit
+# - ("phase", qubits, terms) applies a run of diagonal gates, where each term is (control, target, phase0, phase1)
+#   with the control being None for a single-qubit gate, and phase0 and phase1 being the phases when the target is zero and one
+# - ("flip", (target,), 1) flips a qubit, and ("flip", (control, target), value) flips the target qubit wherever the control qubit equals value
+# - ("swap", (qubit1, qubit2), None) swaps two qubits
+
+
+# The two-qubit gates that only permute the basis states, by the index each basis state is sent to
+# Each flip is given as the (index within the gate's qubits of) its control and target, and the value of the control it flips on
+_flips = {
+    (1, 0, 3, 2): (None, 1, 1),
+    (2, 3, 0, 1): (None, 0, 1),
+    (0, 1, 3, 2): (0, 1, 1),
+    (1, 0, 2, 3): (0, 1, 0),
+    (0, 3, 2, 1): (1, 0, 1),
+    (2, 1, 0, 3): (1, 0, 0),
+}
+_swap = (0, 2, 1, 3)
+_permutation_matrices = {
+    permutation: np.eye(4)[:, permutation] for permutation in list(_flips) + [_swap]
+}
+
+
+def to_phase(op):
+    """
+    Return a diagonal (single-qubit or controlled) gate operation as a phase operation, or any other operation unchanged.
+    """
+    kind, qubits, matrix = op
+    if not (kind == "cgate" or (kind == "gate" and len(qubits) == 1)):
+        return op
+    if matrix[0, 1] != 0 or matrix[1, 0] != 0:
+        return op
+    control = qubits[0] if kind == "cgate" else None
+    return ("phase", qubits, [(control, qubits[-1], matrix[0, 0], matrix[1, 1])])
+
+
+def to_permutation(op):
+    """
+    Return an X-like (single-qubit, controlled or two-qubit) gate operation as a flip or swap operation, or any other operation unchanged.
+    """
+    kind, qubits, matrix = op
+    if kind not in ("gate", "cgate"):
+        return op
+    if matrix.shape == (2, 2):
+        if not (
+            matrix[0, 0] == 0
+            and matrix[1, 1] == 0
+            and matrix[0, 1] == 1
+            and matrix[1, 0] == 1
+        ):
+            return op
+        return ("flip", qubits, 1)
+    for permutation, permutation_matrix in _permutation_matrices.items():
+        if np.array_equal(matrix, permutation_matrix):
+            if permutation == _swap:
+                return ("swap", qubits, None)
+            control, target, value = _flips[permutation]
+            if control is None:
+                return ("flip", (qubits[target],), 1)
+            return ("flip", (qubits[control], qubits[target]), value)
+    return op
+
+
+def f2_op(f, qubit1, qubit2):
+    """
+    The operation of the f2 oracle `f` on `qubit1` and `qubit2`, which is a flip (or, for const0, the identity gate).
+    """
+    if f == "const0":
+        return ("gate", (qubit1, qubit2), np.eye(4, dtype=np.complex128))
+    if f == "const1":
+        return ("flip", (qubit2,), 1)
+    return ("flip", (qubit1, qubit2), 1 if f == "bal0" else 0)
+
+
+def permutation_args(op, num_qubits):
+    """
+    The arguments of a flip or swap operation, as used by the `apply_flip` and `apply_swap` kernels (after the state).
+    """
+    kind, qubits, value = op
+    bits = tuple(num_qubits - qubit for qubit in qubits)
+    if kind == "swap":
+        return (None,) + bits
+    if len(bits) == 1:
+        return (value, -1) + bits
+    return (value,) + bits
+
+
+def phase_arrays(terms, num_qubits, dtype):
+    """
+    The `phases` and `positions` arrays of a phase operation's terms, as used by the `apply_phases` kernel.
+    """
+    phases = np.asarray(
+        [(phase0, phase1) for _, _, phase0, phase1 in terms], dtype=dtype
+    )
+    positions = np.asarray(
+        [
+            (-1 if control is None else num_qubits - control, num_qubits - target)
+            for control, target, _, _ in terms
+        ],
+        dtype=np.int64,
+    )
+    return phases, positions
+
+
+def fuse(ops):
+    """
+    Fuse runs of operations that act on the same qubit(s) into single operations.
+
+    Single-qubit gates are multiplied together until another operation touches their qubit.
+    Consecutive gates (or controlled gates) on the same qubits are also multiplied together.
+    Diagonal gates all commute, so consecutive diagonal gates on any qubits become a single phase operation.
+    The fused gates that only permute the basis states become flip or swap operations.
+    """
+    fused = []
+    # The product of the single-qubit gates waiting on each qubit
+    waiting = {}
+    for kind, qubits, matrix in ops:
+        if kind == "gate" and len(qubits) == 1:
+            qubit = qubits[0]
+            if qubit in waiting:
+                waiting[qubit] = matrix @ waiting[qubit]
+            else:
+                waiting[qubit] = matrix
+            continue
+        # Any gates waiting on the qubits of this operation must be applied first
+        for qubit in qubits:
+            if qubit in waiting:
+                fused.append(("gate", (qubit,), waiting.pop(qubit)))
+        if (
+            kind in ("gate", "cgate")
+            and fused
+            and fused[-1][0] == kind
+            and fused[-1][1] == qubits
+        ):
+            fused[-1] = (kind, qubits, matrix @ fused[-1][2])
+        else:
+            fused.append((kind, qubits, matrix))
+    # The remaining waiting gates act on different qubits, so the order they are applied in does not matter
+    for qubit, matrix in waiting.items():
+        fused.append(("gate", (qubit,), matrix))
+    merged = []
+    for op in fused:
+        op = to_permutation(to_phase(op))
+        if op[0] == "phase" and merged and merged[-1][0] == "phase":
+            _, qubits, terms = merged[-1]
+            qubits = qubits + tuple(q for q in op[1] if q not in qubits)
+            merged[-1] = ("phase", qubits, terms + op[2])
+        else:
+            merged.append(op)
+    return merged
@@ -74,6 +74,105 @@ class T:
         return [["T"]]
 
 
+# Rotation gates are parameterized by angles, and also give the derivative of their matrix with respect to each angle (for computing gradients)
+
+
+class RX:
+    @classmethod
+    def matrix(cls, theta):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return np.array([[c + 0j, -1j * s], [-1j * s, c + 0j]])
+
+    @classmethod
+    def derivatives(cls, theta):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return [np.array([[-s + 0j, -1j * c], [-1j * c, -s + 0j]]) / 2]
+
+    @classmethod
+    def gate(cls):
+        return [["R", "X"]]
+
+
+class RY:
+    @classmethod
+    def matrix(cls, theta):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return np.array([[c + 0j, -s + 0j], [s + 0j, c + 0j]])
+
+    @classmethod
+    def derivatives(cls, theta):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return [np.array([[-s + 0j, -c + 0j], [c + 0j, -s + 0j]]) / 2]
+
+    @classmethod
+    def gate(cls):
+        return [["R", "Y"]]
+
+
+class RZ:
+    @classmethod
+    def matrix(cls, theta):
+        return np.array(
+            [[np.exp(-0.5j * theta), 0 + 0j], [0 + 0j, np.exp(0.5j * theta)]]
+        )
+
+    @classmethod
+    def derivatives(cls, theta):
+        return [
+            np.array(
+                [
+                    [-0.5j * np.exp(-0.5j * theta), 0 + 0j],
+                    [0 + 0j, 0.5j * np.exp(0.5j * theta)],
+                ]
+            )
+        ]
+
+    @classmethod
+    def gate(cls):
+        return [["R", "Z"]]
+
+
+class U3:
+    @classmethod
+    def matrix(cls, theta, phi, lam):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return np.array(
+            [
+                [c + 0j, -np.exp(1j * lam) * s],
+                [np.exp(1j * phi) * s, np.exp(1j * (phi + lam)) * c],
+            ]
+        )
+
+    @classmethod
+    def derivatives(cls, theta, phi, lam):
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return [
+            np.array(
+                [
+                    [-s + 0j, -np.exp(1j * lam) * c],
+                    [np.exp(1j * phi) * c, -np.exp(1j * (phi + lam)) * s],
+                ]
+            )
+            / 2,
+            np.array(
+                [
+                    [0 + 0j, 0 + 0j],
+                    [1j * np.exp(1j * phi) * s, 1j * np.exp(1j * (phi + lam)) * c],
+                ]
+            ),
+            np.array(
+                [
+                    [0 + 0j, -1j * np.exp(1j * lam) * s],
+                    [0 + 0j, 1j * np.exp(1j * (phi + lam)) * c],
+                ]
+            ),
+        ]
+
+    @classmethod
+    def gate(cls):
+        return [["U", "3"]]
+
+
 class CNOT:
     @classmethod
     def matrix(cls):
@@ -134,6 +233,26 @@ class CT:
         return utils._cgate(control, target, T.gate()[0][0])
 
 
+class SWAP:
+    @classmethod
+    def matrix(cls):
+        return np.array(
+            [
+                [1 + 0j, 0 + 0j, 0 + 0j, 0 + 0j],
+                [0 + 0j, 0 + 0j, 1 + 0j, 0 + 0j],
+                [0 + 0j, 1 + 0j, 0 + 0j, 0 + 0j],
+                [0 + 0j, 0 + 0j, 0 + 0j, 1 + 0j],
+            ]
+        )
+
+    @classmethod
+    def gate(cls, qubit1, qubit2):
+        # Both ends of a SWAP are drawn the same way
+        return [
+            ["x"] if row == ["O"] else row for row in utils._cgate(qubit1, qubit2, "x")
+        ]
+
+
 class f2:
     @classmethod
     def matrix(cls, f=None):
@@ -177,5 +296,44 @@ class f2:
             )
 
     @classmethod
-    def gate(cls):
-        return [["|", "-", "-", "|"], ["|", "f", "2", "|"], ["|", "-", "-", "|"]]
+    def gate(cls, qubit1=1, qubit2=2):
+        # A box spanning every qubit from `qubit1` to `qubit2`, with the label in the middle
+        rows = 2 * abs(qubit2 - qubit1) + 1
+        gate = [["|", " ", " ", "|"] for _ in range(rows)]
+        gate[0] = ["|", "-", "-", "|"]
+        gate[-1] = ["|", "-", "-", "|"]
+        gate[rows // 2] = ["|", "f", "2", "|"]
+        return gate
+
+
+class Unitary:
+    """
+    A custom gate, given by a unitary matrix acting on any number of qubits.
+
+    The matrix is validated when the gate is created, so the gate can be applied any number of times without being checked again.
+    """
+
+    __slots__ = ("_matrix", "num_qubits")
+
+    def __init__(self, matrix):
+        matrix = np.array(matrix, dtype=np.complex128)
+        size = matrix.shape[0] if matrix.ndim == 2 else 0
+        if matrix.shape != (size, size) or size < 2 or size & (size - 1) != 0:
+            raise utils.PyQubitsError(
+                "'matrix' must be a square matrix, with a power of two (and at least two) rows"
+            )
+        if not np.allclose(matrix.conj().T @ matrix, np.eye(size), atol=1e-6):
+            raise utils.PyQubitsError("'matrix' must be unitary")
+        self._matrix = matrix
+        self.num_qubits = size.bit_length() - 1
+
+    def matrix(self):
+        return self._matrix
+
+    @classmethod
+    def gate(cls, qubit1, qubit2):
+        # A box spanning every qubit from `qubit1` to `qubit2`, as the qubits in between may also be acted on
+        if qubit1 == qubit2:
+            return [["U"]]
+        rows = 2 * abs(qubit2 - qubit1) + 1
+        return [["|", "U" if row % 2 == 0 else " ", "|"] for row in range(rows)]
@@ -0,0 +1,66 @@
+import numpy as np
+from pyqubits.utils import PyQubitsError
+from pyqubits.pauli import parse_observable
+from pyqubits.kernels import apply_observable
+from pyqubits.circuit import Circuit
+from pyqubits.quantumstate import QuantumState
+
+
+# The adjoint method differentiates the expectation value <psi|O|psi> of a circuit's final state in one backward pass over its gates
+# Starting from the end with |psi> and |lambda> = O|psi>, each gate U is undone on both, and for each of its angles:
+#   d<O>/dangle = 2 Re <lambda| dU/dangle |psi before U>
+# So only three state vectors are kept (psi, lambda and one scratch vector), however many parameters the circuit has
+
+
+def _inverse(op):
+    # The inverse of a (unitary) gate, or controlled gate, operation, where flips and swaps are their own inverses
+    kind, qubits, matrix = op
+    if kind in ("flip", "swap"):
+        return op
+    return (kind, qubits, matrix.conj().T)
+
+
+def gradient(circuit, observable, state=None):
+    """
+    The gradient of the expectation value of an `observable` (as for `QuantumState.expectation`), after running a `circuit` on a `state`.
+
+    The gradient is with respect to the angle(s) of each rotation gate in the circuit, in the same order as `circuit.parameters`.
+    The `state` is a `QuantumState` or vector (and by default, every qubit is zero), and is left unchanged.
+    The circuit is run forwards once, and then undone gate by gate, so the cost is a small multiple of running the circuit once.
+    """
+    if not isinstance(circuit, Circuit):
+        raise PyQubitsError("'circuit' must be a Circuit")
+    if any(op[0] == "measure" for op, _ in circuit._ops):
+        raise PyQubitsError("A circuit containing measurements cannot be differentiated")
+    n = circuit._num_qubits
+    if state is None:
+        state = QuantumState.from_bits("0" * n)
+    if isinstance(state, QuantumState):
+        if state._num_qubits != n:
+            raise PyQubitsError(
+                "The state must have the same number of qubits as the circuit"
+            )
+        state = state._snapshot()
+    coefficients, x_masks, z_masks, num_ys = parse_observable(observable, n)
+    weights = coefficients * (1j ** (num_ys % 4))
+    psi = QuantumState._from_state_vector(circuit.run(state))
+    lam = QuantumState._from_state_vector(np.empty_like(psi._state_vector))
+    apply_observable(psi._state_vector, lam._state_vector, weights, x_masks, z_masks)
+    scratch = QuantumState._from_state_vector(np.empty_like(psi._state_vector))
+    gradients = []
+    for (op, _), parameters in zip(
+        reversed(circuit._ops), reversed(circuit._parameters)
+    ):
+        inverse = _inverse(op)
+        psi._execute(inverse)
+        if parameters is not None:
+            gate, angles = parameters
+            # The derivatives are found last to first, to match the order they are collected in
+            for derivative in reversed(gate.derivatives(*angles)):
+                scratch._state_vector[:] = psi._state_vector
+                scratch._execute((op[0], op[1], derivative))
+                gradients.append(
+                    2 * np.vdot(lam._state_vector, scratch._state_vector).real
+                )
+        lam._execute(inverse)
+    return np.asarray(gradients[::-1], dtype=np.float64)
@@ -0,0 +1,503 @@
+import math
+import numpy as np
+import numba as nb
+
+
+# Qubit `q` of an `n` qubit state corresponds to bit `n - q` of a basis state index
+# So qubit 1 is the most significant bit, and qubit `n` is the least significant bit
+
+
+@nb.njit(inline="always", cache=True)
+def _insert_zero(k, bit):
+    """
+    Insert a zero into the binary representation of `k` at position `bit`.
+    """
+    return ((k >> bit) << (bit + 1)) | (k & ((1 << bit) - 1))
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_single(state, gate, bit):
+    """
+    Apply a 2x2 `gate` (in place) to the qubit at position `bit` of the state.
+
+    Each amplitude is only paired with the amplitude `2**bit` indices away, so the state is walked once.
+    """
+    stride = 1 << bit
+    g00, g01, g10, g11 = gate[0, 0], gate[0, 1], gate[1, 0], gate[1, 1]
+    for k in nb.prange(len(state) // 2):
+        i = _insert_zero(k, bit)
+        j = i | stride
+        a = state[i]
+        b = state[j]
+        state[i] = g00 * a + g01 * b
+        state[j] = g10 * a + g11 * b
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_double(state, gate, bit1, bit2):
+    """
+    Apply a 4x4 `gate` (in place) to the qubits at positions `bit1` and `bit2` of the state.
+
+    The qubit at `bit1` is treated as the most significant qubit of the gate.
+    """
+    low = min(bit1, bit2)
+    high = max(bit1, bit2)
+    stride1 = 1 << bit1
+    stride2 = 1 << bit2
+    for k in nb.prange(len(state) // 4):
+        i0 = _insert_zero(_insert_zero(k, low), high)
+        i1 = i0 | stride2
+        i2 = i0 | stride1
+        i3 = i2 | stride2
+        a0 = state[i0]
+        a1 = state[i1]
+        a2 = state[i2]
+        a3 = state[i3]
+        state[i0] = gate[0, 0] * a0 + gate[0, 1] * a1 + gate[0, 2] * a2 + gate[0, 3] * a3
+        state[i1] = gate[1, 0] * a0 + gate[1, 1] * a1 + gate[1, 2] * a2 + gate[1, 3] * a3
+        state[i2] = gate[2, 0] * a0 + gate[2, 1] * a1 + gate[2, 2] * a2 + gate[2, 3] * a3
+        state[i3] = gate[3, 0] * a0 + gate[3, 1] * a1 + gate[3, 2] * a2 + gate[3, 3] * a3
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_controlled(state, gate, control_bit, target_bit):
+    """
+    Apply a 2x2 `gate` (in place) to the qubit at position `target_bit`, controlled by the qubit at position `control_bit`.
+
+    Only the amplitudes where the control qubit is one are visited.
+    """
+    low = min(control_bit, target_bit)
+    high = max(control_bit, target_bit)
+    control = 1 << control_bit
+    stride = 1 << target_bit
+    g00, g01, g10, g11 = gate[0, 0], gate[0, 1], gate[1, 0], gate[1, 1]
+    for k in nb.prange(len(state) // 4):
+        i = _insert_zero(_insert_zero(k, low), high) | control
+        j = i | stride
+        a = state[i]
+        b = state[j]
+        state[i] = g00 * a + g01 * b
+        state[j] = g10 * a + g11 * b
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_flip(state, value, control_bit, target_bit):
+    """
+    Flip the qubit at position `target_bit` (in place) by swapping amplitudes, wherever the qubit at position `control_bit` equals `value`.
+
+    If `control_bit` is negative, the qubit is flipped everywhere (the X gate).
+    No arithmetic is done, and only the amplitudes that move are visited.
+    """
+    stride = 1 << target_bit
+    if control_bit < 0:
+        for k in nb.prange(len(state) // 2):
+            i = _insert_zero(k, target_bit)
+            j = i | stride
+            state[i], state[j] = state[j], state[i]
+    else:
+        low = min(control_bit, target_bit)
+        high = max(control_bit, target_bit)
+        control = value << control_bit
+        for k in nb.prange(len(state) // 4):
+            i = _insert_zero(_insert_zero(k, low), high) | control
+            j = i | stride
+            state[i], state[j] = state[j], state[i]
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_swap(state, gate, bit1, bit2):
+    """
+    Swap the qubits at positions `bit1` and `bit2` (in place), by exchanging the amplitudes where they differ.
+
+    A SWAP has no parameters, so `gate` is ignored (it is only there so that every kernel is called the same way).
+    """
+    low = min(bit1, bit2)
+    high = max(bit1, bit2)
+    stride1 = 1 << bit1
+    stride2 = 1 << bit2
+    for k in nb.prange(len(state) // 4):
+        base = _insert_zero(_insert_zero(k, low), high)
+        i = base | stride1
+        j = base | stride2
+        state[i], state[j] = state[j], state[i]
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_phases(state, phases, positions):
+    """
+    Multiply each amplitude (in place) by the phases of a run of diagonal gates, in a single pass over the state.
+
+    Row `g` of `positions` holds the control bit (or -1 if there is none) and target bit of gate `g`,
+    and row `g` of `phases` holds the phases it applies when its target qubit is zero and one.
+    """
+    for i in nb.prange(len(state)):
+        amplitude = state[i]
+        for g in range(len(positions)):
+            control = positions[g, 0]
+            if control < 0 or (i >> control) & 1:
+                amplitude *= phases[g, (i >> positions[g, 1]) & 1]
+        state[i] = amplitude
+
+
+def apply_matrix(state, gate, *bits):
+    """
+    Apply a 2**k x 2**k `gate` (in place) to the k qubits at positions `bits` of the state, with the first as the most significant qubit of the gate.
+
+    The gate is contracted with the state viewed as a (2,)*n tensor, so no matrix larger than the gate is ever built.
+    This is not compiled, as the contraction is already done by (multithreaded) BLAS.
+    """
+    num_bits = int(math.log2(len(state)))
+    k = len(bits)
+    axes = [num_bits - 1 - bit for bit in bits]
+    view = state.reshape((2,) * num_bits)
+    result = np.tensordot(
+        gate.reshape((2,) * (2 * k)), view, axes=(range(k, 2 * k), axes)
+    )
+    # The gate's output axes come first, so are moved back to where the qubits were
+    view[...] = np.moveaxis(result, range(k), axes)
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def probabilities(state, bit):
+    """
+    Return the (unnormalised) probabilities of the qubit at position `bit` being measured as zero and one.
+    """
+    mask = 1 << bit
+    zero = 0.0
+    one = 0.0
+    for i in nb.prange(len(state)):
+        p = state[i].real * state[i].real + state[i].imag * state[i].imag
+        if i & mask:
+            one += p
+        else:
+            zero += p
+    return zero, one
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def collapse(state, bit, value, scale):
+    """
+    Collapse the qubit at position `bit` (in place) to `value`.
+
+    Amplitudes that disagree with `value` are zeroed, and the remaining amplitudes are multiplied by `scale`.
+    """
+    stride = 1 << bit
+    for k in nb.prange(len(state) // 2):
+        i = _insert_zero(k, bit)
+        j = i | stride
+        if value:
+            state[i] = 0
+            state[j] *= scale
+        else:
+            state[i] *= scale
+            state[j] = 0
+
+
+# Batched kernels, which apply the same operation to every row of a (K, 2**n) array of states
+# The rows and the amplitude pairs are walked together, so that the work is spread across all cores even for small states
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_single_batch(states, gate, bit):
+    """
+    Apply a 2x2 `gate` (in place) to the qubit at position `bit` of every state.
+    """
+    stride = 1 << bit
+    half = states.shape[1] // 2
+    g00, g01, g10, g11 = gate[0, 0], gate[0, 1], gate[1, 0], gate[1, 1]
+    for r in nb.prange(states.shape[0] * half):
+        row = r // half
+        i = _insert_zero(r % half, bit)
+        j = i | stride
+        a = states[row, i]
+        b = states[row, j]
+        states[row, i] = g00 * a + g01 * b
+        states[row, j] = g10 * a + g11 * b
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_double_batch(states, gate, bit1, bit2):
+    """
+    Apply a 4x4 `gate` (in place) to the qubits at positions `bit1` and `bit2` of every state.
+    """
+    low = min(bit1, bit2)
+    high = max(bit1, bit2)
+    stride1 = 1 << bit1
+    stride2 = 1 << bit2
+    quarter = states.shape[1] // 4
+    for r in nb.prange(states.shape[0] * quarter):
+        row = r // quarter
+        i0 = _insert_zero(_insert_zero(r % quarter, low), high)
+        i1 = i0 | stride2
+        i2 = i0 | stride1
+        i3 = i2 | stride2
+        a0 = states[row, i0]
+        a1 = states[row, i1]
+        a2 = states[row, i2]
+        a3 = states[row, i3]
+        states[row, i0] = gate[0, 0] * a0 + gate[0, 1] * a1 + gate[0, 2] * a2 + gate[0, 3] * a3
+        states[row, i1] = gate[1, 0] * a0 + gate[1, 1] * a1 + gate[1, 2] * a2 + gate[1, 3] * a3
+        states[row, i2] = gate[2, 0] * a0 + gate[2, 1] * a1 + gate[2, 2] * a2 + gate[2, 3] * a3
+        states[row, i3] = gate[3, 0] * a0 + gate[3, 1] * a1 + gate[3, 2] * a2 + gate[3, 3] * a3
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_controlled_batch(states, gate, control_bit, target_bit):
+    """
+    Apply a 2x2 `gate` (in place) to the qubit at position `target_bit` of every state, controlled by the qubit at position `control_bit`.
+    """
+    low = min(control_bit, target_bit)
+    high = max(control_bit, target_bit)
+    control = 1 << control_bit
+    stride = 1 << target_bit
+    quarter = states.shape[1] // 4
+    g00, g01, g10, g11 = gate[0, 0], gate[0, 1], gate[1, 0], gate[1, 1]
+    for r in nb.prange(states.shape[0] * quarter):
+        row = r // quarter
+        i = _insert_zero(_insert_zero(r % quarter, low), high) | control
+        j = i | stride
+        a = states[row, i]
+        b = states[row, j]
+        states[row, i] = g00 * a + g01 * b
+        states[row, j] = g10 * a + g11 * b
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_flip_batch(states, value, control_bit, target_bit):
+    """
+    Flip the qubit at position `target_bit` of every state (in place), wherever the qubit at position `control_bit` equals `value`.
+    """
+    stride = 1 << target_bit
+    quarter = states.shape[1] // 4
+    half = states.shape[1] // 2
+    if control_bit < 0:
+        for r in nb.prange(states.shape[0] * half):
+            row = r // half
+            i = _insert_zero(r % half, target_bit)
+            j = i | stride
+            states[row, i], states[row, j] = states[row, j], states[row, i]
+    else:
+        low = min(control_bit, target_bit)
+        high = max(control_bit, target_bit)
+        control = value << control_bit
+        for r in nb.prange(states.shape[0] * quarter):
+            row = r // quarter
+            i = _insert_zero(_insert_zero(r % quarter, low), high) | control
+            j = i | stride
+            states[row, i], states[row, j] = states[row, j], states[row, i]
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_swap_batch(states, gate, bit1, bit2):
+    """
+    Swap the qubits at positions `bit1` and `bit2` of every state (in place).
+    """
+    low = min(bit1, bit2)
+    high = max(bit1, bit2)
+    stride1 = 1 << bit1
+    stride2 = 1 << bit2
+    quarter = states.shape[1] // 4
+    for r in nb.prange(states.shape[0] * quarter):
+        row = r // quarter
+        base = _insert_zero(_insert_zero(r % quarter, low), high)
+        i = base | stride1
+        j = base | stride2
+        states[row, i], states[row, j] = states[row, j], states[row, i]
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_phases_batch(states, phases, positions):
+    """
+    Multiply each amplitude of every state (in place) by the phases of a run of diagonal gates.
+    """
+    length = states.shape[1]
+    for r in nb.prange(states.shape[0] * length):
+        row = r // length
+        i = r % length
+        amplitude = states[row, i]
+        for g in range(len(positions)):
+            control = positions[g, 0]
+            if control < 0 or (i >> control) & 1:
+                amplitude *= phases[g, (i >> positions[g, 1]) & 1]
+        states[row, i] = amplitude
+
+
+def apply_matrix_batch(states, gate, *bits):
+    """
+    Apply a 2**k x 2**k `gate` (in place) to the k qubits at positions `bits` of every state.
+    """
+    num_bits = int(math.log2(states.shape[1]))
+    k = len(bits)
+    axes = [num_bits - bit for bit in bits]
+    view = states.reshape((len(states),) + (2,) * num_bits)
+    result = np.tensordot(
+        gate.reshape((2,) * (2 * k)), view, axes=(range(k, 2 * k), axes)
+    )
+    view[...] = np.moveaxis(result, range(k), axes)
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def probabilities_batch(states, bit):
+    """
+    Return the (unnormalised) probabilities of the qubit at position `bit` of each state being measured as zero and one.
+    """
+    mask = 1 << bit
+    result = np.zeros((states.shape[0], 2))
+    for row in nb.prange(states.shape[0]):
+        zero = 0.0
+        one = 0.0
+        for i in range(states.shape[1]):
+            p = states[row, i].real * states[row, i].real + states[row, i].imag * states[row, i].imag
+            if i & mask:
+                one += p
+            else:
+                zero += p
+        result[row, 0] = zero
+        result[row, 1] = one
+    return result
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def collapse_batch(states, bit, values, scales):
+    """
+    Collapse the qubit at position `bit` of each state (in place) to the corresponding entry of `values`.
+    """
+    stride = 1 << bit
+    half = states.shape[1] // 2
+    for r in nb.prange(states.shape[0] * half):
+        row = r // half
+        i = _insert_zero(r % half, bit)
+        j = i | stride
+        if values[row]:
+            states[row, i] = 0
+            states[row, j] *= scales[row]
+        else:
+            states[row, i] *= scales[row]
+            states[row, j] = 0
+
+
+@nb.njit(inline="always", cache=True)
+def _parity(k):
+    """
+    Return the parity (the number of ones, modulo two) of the binary representation of `k`.
+    """
+    k ^= k >> 32
+    k ^= k >> 16
+    k ^= k >> 8
+    k ^= k >> 4
+    k ^= k >> 2
+    k ^= k >> 1
+    return k & 1
+
+
+@nb.njit(inline="always", cache=True)
+def _y_phase(real, imag, num_y):
+    """
+    Return the real part of (real + imag * 1j), multiplied by a factor of i for each of `num_y` Y gates (as Y = iXZ).
+    """
+    if num_y % 4 == 0:
+        return real
+    elif num_y % 4 == 1:
+        return -imag
+    elif num_y % 4 == 2:
+        return -real
+    else:
+        return imag
+
+
+@nb.njit(fastmath=True, cache=True)
+def _pauli_term(state, x_mask, z_mask, num_y):
+    # <state|P|state>, where P flips the bits in `x_mask`, and negates amplitudes with an odd number of ones in `z_mask`
+    real = 0.0
+    imag = 0.0
+    for i in range(len(state)):
+        term = state[i ^ x_mask].conjugate() * state[i]
+        if _parity(i & z_mask):
+            term = -term
+        real += term.real
+        imag += term.imag
+    return _y_phase(real, imag, num_y)
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def pauli_expectation(state, x_mask, z_mask, num_y):
+    """
+    Return the expectation value of a single Pauli string, described by its bitmasks, with the work spread over the amplitudes.
+    """
+    real = 0.0
+    imag = 0.0
+    for i in nb.prange(len(state)):
+        term = state[i ^ x_mask].conjugate() * state[i]
+        if _parity(i & z_mask):
+            term = -term
+        real += term.real
+        imag += term.imag
+    return _y_phase(real, imag, num_y)
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def pauli_expectations(state, x_masks, z_masks, num_ys):
+    """
+    Return the expectation value of each of many Pauli strings, with the work spread over the strings.
+    """
+    result = np.zeros(len(x_masks))
+    for t in nb.prange(len(x_masks)):
+        result[t] = _pauli_term(state, x_masks[t], z_masks[t], num_ys[t])
+    return result
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
+def apply_observable(state, out, weights, x_masks, z_masks):
+    """
+    Set `out` to an observable (a weighted sum of Pauli strings, described by their bitmasks) applied to the state.
+
+    Each weight is a Pauli string's coefficient, multiplied by a factor of i for each of its Y gates (as Y = iXZ).
+    """
+    for j in nb.prange(len(state)):
+        total = 0j
+        for t in range(len(x_masks)):
+            # The Pauli string sends basis state i to j = i ^ x_mask
+            i = j ^ x_masks[t]
+            term = weights[t] * state[i]
+            if _parity(i & z_masks[t]):
+                term = -term
+            total += term
+        out[j] = total
+
+
+def warmup():
+    """
+    Compile every kernel, for both single and double precision states.
+
+    Kernels are otherwise compiled the first time they are used (and the compiled code is cached on disk for later processes),
+    so this is only needed by programs that want to pay the compilation cost up front.
+    """
+    for dtype in [np.complex64, np.complex128]:
+        state = np.zeros(4, dtype=dtype)
+        states = np.zeros((1, 4), dtype=dtype)
+        gate = np.eye(2, dtype=dtype)
+        apply_single(state, gate, 0)
+        apply_double(state, np.eye(4, dtype=dtype), 1, 0)
+        apply_controlled(state, gate, 1, 0)
+        apply_flip(state, 1, -1, 0)
+        apply_flip(state, 1, 1, 0)
+        apply_swap(state, None, 1, 0)
+        positions = np.asarray([[-1, 0], [1, 0]], dtype=np.int64)
+        apply_phases(state, np.ones((2, 2), dtype=dtype), positions)
+        probabilities(state, 0)
+        collapse(state, 0, 0, 1.0)
+        apply_single_batch(states, gate, 0)
+        apply_double_batch(states, np.eye(4, dtype=dtype), 1, 0)
+        apply_controlled_batch(states, gate, 1, 0)
+        apply_flip_batch(states, 1, -1, 0)
+        apply_flip_batch(states, 1, 1, 0)
+        apply_swap_batch(states, None, 1, 0)
+        apply_phases_batch(states, np.ones((2, 2), dtype=dtype), positions)
+        probabilities_batch(states, 0)
+        collapse_batch(states, 0, np.zeros(1, dtype=np.int64), np.ones(1))
+        masks = np.zeros(1, dtype=np.int64)
+        pauli_expectation(state, 1, 1, 1)
+        pauli_expectations(state, masks, masks, masks)
+        weights = np.ones(1, dtype=np.complex128)
+        apply_observable(state, state.copy(), weights, masks, masks)
+
@@ -0,0 +1,440 @@
+import random
+import numpy as np
+from pyqubits.utils import (
+    PyQubitsError,
+    validate_qubits,
+    validate_dtype,
+    validate_angles,
+)
+from pyqubits.quantumstate import QuantumState
+from pyqubits.gates import (
+    X,
+    Y,
+    Z,
+    H,
+    P,
+    T,
+    CNOT,
+    CY,
+    CZ,
+    CH,
+    CP,
+    CT,
+    f2,
+    RX,
+    RY,
+    RZ,
+    U3,
+)
+
+
+# A matrix product state stores an n-qubit state as a chain of n tensors, one per qubit
+# Each tensor has shape (left bond, 2, right bond), and the amplitude of a basis state is the product of the matrices chosen by its bits
+# The bond dimensions grow with the entanglement between each side of the chain, so weakly entangled states need little memory
+
+
+_swap_matrix = np.array(
+    [[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=np.complex128
+)
+
+
+def _controlled_matrix(gate, control_first):
+    # The 4x4 matrix of a controlled gate, acting on a pair of qubits with the control as the first (or second) qubit
+    zero = np.diag([1, 0]).astype(np.complex128)
+    one = np.diag([0, 1]).astype(np.complex128)
+    if control_first:
+        return np.kron(zero, np.eye(2)) + np.kron(one, gate)
+    return np.kron(np.eye(2), zero) + np.kron(gate, one)
+
+
+class MPSState:
+    """
+    A class for simulating multi-qubit states as a matrix product state (MPS).
+
+    Two qubit gates are applied to neighbouring qubits by contracting their tensors and splitting them again with an SVD.
+    Gates on distant qubits are routed by swapping one qubit next to the other, and back again afterwards.
+    If `max_bond` is given, each bond keeps at most that many singular values, and the discarded weight is added to the `truncation_error`.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_tensors",
+        "_center",
+        "_max_bond",
+        "_truncation_error",
+        "_bit",
+    )
+
+    def __init__(self, n: int = 1, max_bond=None, dtype=None):
+        if (not isinstance(n, int)) or n < 1:
+            raise PyQubitsError("'n' must be a positive integer")
+        if max_bond is not None and ((not isinstance(max_bond, int)) or max_bond < 1):
+            raise PyQubitsError("'max_bond' must be a positive integer")
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
+        self._num_qubits = n
+        # The state is created as a product of random qubits, so every bond has dimension one
+        qubit_vectors = (2 * np.random.random((n, 2)) - 1) + (
+            2 * np.random.random((n, 2)) - 1
+        ) * 1j  # complex128
+        qubit_vectors /= np.linalg.norm(qubit_vectors, axis=1)[:, None]
+        self._tensors = [v.reshape(1, 2, 1).astype(dtype) for v in qubit_vectors]
+        # The index of the tensor that every other tensor is orthonormal towards
+        self._center = 0
+        self._max_bond = max_bond
+        self._truncation_error = 0.0
+        self._bit = None
+
+    @classmethod
+    def from_bits(cls, bits: str, max_bond=None, dtype=None):
+        """
+        Construct an `MPSState` object from a string of '0', '1' and 'q' (random) qubits.
+        """
+        if not isinstance(bits, str) or len(bits) == 0 or any([not c in "01q" for c in bits]):
+            raise PyQubitsError(f"'bits' must be a binary number string")
+        obj = cls(len(bits), max_bond=max_bond, dtype=dtype)
+        for i, c in enumerate(bits):
+            if c != "q":
+                tensor = np.zeros((1, 2, 1), dtype=obj._tensors[i].dtype)
+                tensor[0, int(c), 0] = 1
+                obj._tensors[i] = tensor
+        return obj
+
+    def __repr__(self):
+        return (
+            f"MPSState(num_qubits={self._num_qubits}, "
+            + f"bond_dimensions={self.bond_dimensions})"
+        )
+
+    @property
+    def vector(self):
+        """
+        NumPy array of the (dense) state vector, which has 2**n amplitudes so is only suitable for small states.
+        """
+        result = np.ones((1, 1), dtype=self._tensors[0].dtype)
+        for tensor in self._tensors:
+            result = np.tensordot(result, tensor, axes=([1], [0])).reshape(
+                -1, tensor.shape[2]
+            )
+        return result.reshape(-1)
+
+    def amplitude(self, bits: str):
+        """
+        The amplitude of the basis state given by the binary number string `bits`.
+        """
+        if (
+            not isinstance(bits, str)
+            or len(bits) != self._num_qubits
+            or any([not c in "01" for c in bits])
+        ):
+            raise PyQubitsError(
+                "'bits' must be a binary number string, with one bit for each qubit in the state"
+            )
+        result = np.ones((1, 1), dtype=self._tensors[0].dtype)
+        for tensor, c in zip(self._tensors, bits):
+            result = result @ tensor[:, int(c), :]
+        return result[0, 0]
+
+    @property
+    def dtype(self):
+        """
+        NumPy dtype of the tensors (either complex64 or complex128).
+        """
+        return self._tensors[0].dtype
+
+    @property
+    def bond_dimensions(self):
+        """
+        List of the dimension of each bond, between each qubit and the next.
+        """
+        return [tensor.shape[2] for tensor in self._tensors[:-1]]
+
+    @property
+    def max_bond(self):
+        """
+        The largest dimension that a bond is allowed (None if the bonds are not truncated).
+        """
+        return self._max_bond
+
+    @property
+    def truncation_error(self):
+        """
+        The total weight (sum of squared singular values, relative to the norm of the state) discarded by truncating bonds.
+        """
+        return self._truncation_error
+
+    @property
+    def bit(self):
+        """
+        The outcome of the latest measurement of the quantum state.
+        """
+        return self._bit
+
+    def to_state(self):
+        """
+        A `QuantumState` with the same state vector.
+        """
+        return QuantumState.from_vector(self.vector, dtype=self.dtype)
+
+    def _move_center(self, site):
+        # Make every tensor left of `site` left-orthonormal, and every tensor right of it right-orthonormal, using QR decompositions
+        tensors = self._tensors
+        while self._center < site:
+            i = self._center
+            left, _, right = tensors[i].shape
+            q, r = np.linalg.qr(tensors[i].reshape(left * 2, right))
+            tensors[i] = q.reshape(left, 2, -1)
+            tensors[i + 1] = np.tensordot(r, tensors[i + 1], axes=([1], [0]))
+            self._center += 1
+        while self._center > site:
+            i = self._center
+            left, _, right = tensors[i].shape
+            q, r = np.linalg.qr(tensors[i].reshape(left, 2 * right).T)
+            tensors[i] = q.T.reshape(-1, 2, right)
+            tensors[i - 1] = np.tensordot(tensors[i - 1], r.T, axes=([2], [0]))
+            self._center -= 1
+
+    def _apply_single(self, qubit, gate):
+        i = qubit - 1
+        gate = np.asarray(gate, dtype=self.dtype)
+        # A single qubit gate does not change the orthonormality of any tensor
+        self._tensors[i] = np.einsum("ij,ajb->aib", gate, self._tensors[i])
+
+    def _apply_adjacent(self, i, gate):
+        # Apply a 4x4 gate to the qubits at sites i and i + 1 (with site i as the first qubit)
+        tensors = self._tensors
+        self._move_center(i)
+        left, right = tensors[i].shape[0], tensors[i + 1].shape[2]
+        theta = np.tensordot(tensors[i], tensors[i + 1], axes=([2], [0]))
+        gate = np.asarray(gate, dtype=self.dtype).reshape(2, 2, 2, 2)
+        theta = np.einsum("ijkl,akld->aijd", gate, theta).reshape(left * 2, 2 * right)
+        u, s, vh = np.linalg.svd(theta, full_matrices=False)
+        # Singular values that are (numerically) zero carry no weight, so are always dropped
+        keep = max(1, int(np.sum(s > s[0] * 1e-14)))
+        if self._max_bond is not None:
+            keep = min(keep, self._max_bond)
+        norm = np.sum(s**2)
+        if keep < len(s):
+            self._truncation_error += float(np.sum(s[keep:] ** 2) / norm)
+            s = s[:keep]
+            # The state is renormalised after the truncation
+            s = s / np.sqrt(np.sum(s**2) / norm)
+        tensors[i] = u[:, :keep].reshape(left, 2, keep)
+        tensors[i + 1] = (s[:, None] * vh[:keep]).reshape(keep, 2, right)
+        self._center = i + 1
+
+    def _apply_double(self, qubit1, qubit2, gate):
+        # Apply a 4x4 gate to any two qubits (with qubit1 as the first qubit)
+        if qubit1 > qubit2:
+            # Reorder the gate, so it acts on the qubits in increasing order
+            qubit1, qubit2 = qubit2, qubit1
+            gate = _swap_matrix @ gate @ _swap_matrix
+        i, j = qubit1 - 1, qubit2 - 1
+        # Swap the second qubit along the chain until it neighbours the first, then swap it back afterwards
+        for k in range(j - 1, i, -1):
+            self._apply_adjacent(k, _swap_matrix)
+        self._apply_adjacent(i, gate)
+        for k in range(i + 1, j):
+            self._apply_adjacent(k, _swap_matrix)
+
+    def _apply_cgate(self, control, target, gate):
+        self._apply_double(
+            min(control, target),
+            max(control, target),
+            _controlled_matrix(gate, control < target),
+        )
+
+    def _apply_measure(self, qubit):
+        i = qubit - 1
+        # With every other tensor orthonormal, the probabilities only depend on the qubit's own tensor
+        self._move_center(i)
+        tensor = self._tensors[i]
+        zero_norm = float(np.sum(np.abs(tensor[:, 0, :]) ** 2))
+        one_norm = float(np.sum(np.abs(tensor[:, 1, :]) ** 2))
+        zero_probability = zero_norm / (zero_norm + one_norm)
+        rand = random.uniform(0, 1)
+        bit = 0 if rand <= zero_probability else 1
+        collapsed = np.zeros_like(tensor)
+        collapsed[:, bit, :] = tensor[:, bit, :] / np.sqrt(
+            zero_norm if bit == 0 else one_norm
+        )
+        self._tensors[i] = collapsed
+        self._bit = bit
+
+    @validate_qubits
+    def measure(self, qubit: int):
+        """
+        Measure a `qubit` within the quantum state.
+        """
+        self._apply_measure(qubit)
+        return self
+
+    @validate_qubits
+    def X(self, qubit: int):
+        """
+        Apply the X gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, X.matrix())
+        return self
+
+    @validate_qubits
+    def Y(self, qubit: int):
+        """
+        Apply the Y gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, Y.matrix())
+        return self
+
+    @validate_qubits
+    def Z(self, qubit: int):
+        """
+        Apply the Z gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, Z.matrix())
+        return self
+
+    @validate_qubits
+    def H(self, qubit: int):
+        """
+        Apply the H gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, H.matrix())
+        return self
+
+    @validate_qubits
+    def P(self, qubit: int):
+        """
+        Apply the P gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, P.matrix())
+        return self
+
+    @validate_qubits
+    def T(self, qubit: int):
+        """
+        Apply the T gate to a `qubit` within the quantum state.
+        """
+        self._apply_single(qubit, T.matrix())
+        return self
+
+    @validate_qubits
+    def RX(self, qubit: int, theta: float):
+        """
+        Apply the RX gate (a rotation by `theta` radians around the X axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_single(qubit, RX.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RY(self, qubit: int, theta: float):
+        """
+        Apply the RY gate (a rotation by `theta` radians around the Y axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_single(qubit, RY.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RZ(self, qubit: int, theta: float):
+        """
+        Apply the RZ gate (a rotation by `theta` radians around the Z axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_single(qubit, RZ.matrix(theta))
+        return self
+
+    @validate_qubits
+    def U3(self, qubit: int, theta: float, phi: float, lam: float):
+        """
+        Apply the U3 gate (a general single qubit rotation, by the angles `theta`, `phi` and `lam`) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta, phi, lam)
+        self._apply_single(qubit, U3.matrix(theta, phi, lam))
+        return self
+
+    @validate_qubits
+    def CNOT(self, control: int, target: int):
+        """
+        Apply the CNOT (controlled-X) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CNOT.matrix())
+        return self
+
+    @validate_qubits
+    def CY(self, control: int, target: int):
+        """
+        Apply the CY (controlled-Y) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CY.matrix())
+        return self
+
+    @validate_qubits
+    def CZ(self, control: int, target: int):
+        """
+        Apply the CZ (controlled-Z) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CZ.matrix())
+        return self
+
+    @validate_qubits
+    def CH(self, control: int, target: int):
+        """
+        Apply the CH (controlled-H) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CH.matrix())
+        return self
+
+    @validate_qubits
+    def CP(self, control: int, target: int):
+        """
+        Apply the CP (controlled-P) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CP.matrix())
+        return self
+
+    @validate_qubits
+    def CT(self, control: int, target: int):
+        """
+        Apply the CT (controlled-T) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CT.matrix())
+        return self
+
+    @validate_qubits
+    def f2(self, qubit1: int, qubit2: int, f: str):
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+        if not f in ["const0", "const1", "bal0", "bal1"]:
+            raise PyQubitsError(f"invalid choice of 'f'")
+
+        self._apply_double(qubit1, qubit2, f2.matrix(f))
+        return self
+
+    @validate_qubits
+    def SWAP(self, qubit1: int, qubit2: int):
+        """
+        Apply the SWAP gate to `qubit1` and `qubit2` within the quantum state.
+        """
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+
+        self._apply_double(qubit1, qubit2, _swap_matrix)
+        return self
@@ -0,0 +1,243 @@
+import os
+import multiprocessing
+import numpy as np
+from numbers import Real
+from concurrent.futures import ProcessPoolExecutor
+from pyqubits.utils import PyQubitsError
+from pyqubits.circuit import Circuit
+from pyqubits.quantumstate import QuantumState
+from pyqubits.kernels import apply_single, probabilities, collapse
+from pyqubits.oplog import NAMES
+from pyqubits.gates import X, Y, Z
+
+
+# Noise is simulated with stochastic (Monte-Carlo wavefunction) trajectories
+# Each trajectory is a pure state, where every noise channel randomly applies one of its operators
+# Averaging over many trajectories approximates the (mixed) noisy state, without ever storing its 4**n density matrix
+
+
+def _validate_probability(name, value):
+    if not isinstance(value, Real) or not (0 <= value <= 1):
+        raise PyQubitsError(f"'{name}' must be a number between 0 and 1")
+
+
+class Depolarizing:
+    """
+    A depolarizing channel, which applies a random X, Y or Z error (each equally likely) with probability `p`.
+    """
+
+    __slots__ = ("p",)
+
+    def __init__(self, p):
+        _validate_probability("p", p)
+        self.p = p
+
+    def apply(self, vector, bit, rng):
+        if rng.random() < self.p:
+            error = [X, Y, Z][rng.integers(3)]
+            apply_single(vector, np.asarray(error.matrix(), dtype=vector.dtype), bit)
+
+
+class AmplitudeDamping:
+    """
+    An amplitude damping channel, which decays a qubit from one to zero with probability `gamma`.
+    """
+
+    __slots__ = ("gamma",)
+
+    def __init__(self, gamma):
+        _validate_probability("gamma", gamma)
+        self.gamma = gamma
+
+    def apply(self, vector, bit, rng):
+        _, one_probability = probabilities(vector, bit)
+        if rng.random() < self.gamma * one_probability:
+            # The qubit decays
+            kraus = np.asarray([[0, np.sqrt(self.gamma)], [0, 0]], dtype=vector.dtype)
+        else:
+            kraus = np.asarray(
+                [[1, 0], [0, np.sqrt(1 - self.gamma)]], dtype=vector.dtype
+            )
+        apply_single(vector, kraus, bit)
+        vector /= np.linalg.norm(vector)
+
+
+class ReadoutError:
+    """
+    A readout error, which reads a zero as one with probability `p01`, and a one as zero with probability `p10`.
+    """
+
+    __slots__ = ("p01", "p10")
+
+    def __init__(self, p01, p10=None):
+        _validate_probability("p01", p01)
+        if p10 is None:
+            p10 = p01
+        _validate_probability("p10", p10)
+        self.p01 = p01
+        self.p10 = p10
+
+    def matrix(self):
+        """
+        NumPy array of the probability of reading each bit (row), given the actual bit (column).
+        """
+        return np.asarray([[1 - self.p01, self.p10], [self.p01, 1 - self.p10]])
+
+
+class NoiseModel:
+    """
+    A class for attaching noise channels to the gates and qubits of a circuit.
+    """
+
+    __slots__ = ("_channels",)
+
+    def __init__(self):
+        # Each channel is stored with the gates and qubits it is attached to (None meaning all of them)
+        self._channels = []
+
+    def add(self, channel, gates=None, qubits=None):
+        """
+        Attach a noise `channel` to the `gates` (a list of gate names), acting on any of the `qubits` (a list of qubits).
+
+        By default, a channel is attached to every gate and qubit.
+        Gate channels act after each gate (or measurement), on each of the gate's qubits.
+        Readout errors act on the final probabilities of their qubits.
+        """
+        if not isinstance(channel, (Depolarizing, AmplitudeDamping, ReadoutError)):
+            raise PyQubitsError("'channel' must be a noise channel")
+        if gates is not None and (
+            not isinstance(gates, list) or any([not g in NAMES for g in gates])
+        ):
+            raise PyQubitsError("'gates' must be a list of gate names")
+        if qubits is not None and (
+            not isinstance(qubits, list)
+            or any([(not isinstance(q, int)) or q < 1 for q in qubits])
+        ):
+            raise PyQubitsError("'qubits' must be a list of positive integers")
+        self._channels.append((channel, gates, qubits))
+        return self
+
+    def _gate_channels(self, name, qubit):
+        return [
+            channel
+            for channel, gates, qubits in self._channels
+            if not isinstance(channel, ReadoutError)
+            and (gates is None or name in gates)
+            and (qubits is None or qubit in qubits)
+        ]
+
+    def _readout_errors(self, qubit):
+        return [
+            channel
+            for channel, _, qubits in self._channels
+            if isinstance(channel, ReadoutError) and (qubits is None or qubit in qubits)
+        ]
+
+
+def _run_trajectories(circuit, noise, vector, trajectories, seed):
+    # Run a number of trajectories, and return the sum of their final probabilities
+    rng = np.random.default_rng(seed)
+    n = circuit._num_qubits
+    # Gates are not fused, as noise acts after every individual gate
+    plan = []
+    for op, (name, _, _) in circuit._ops:
+        # Noise acts after each operation (including a measurement), on each of its qubits
+        noise_channels = [
+            (channel, n - qubit)
+            for qubit in op[1]
+            for channel in noise._gate_channels(name, qubit)
+        ]
+        if op[0] == "measure":
+            plan.append((None, op[1], noise_channels))
+        else:
+            plan.append(
+                (circuit._compile_gates([op], vector.dtype), op[1], noise_channels)
+            )
+    total = np.zeros(len(vector))
+    for _ in range(trajectories):
+        trajectory = vector.copy()
+        for steps, qubits, noise_channels in plan:
+            if steps is None:
+                bit_position = n - qubits[0]
+                zero_norm, one_norm = probabilities(trajectory, bit_position)
+                bit = 0 if rng.random() * (zero_norm + one_norm) < zero_norm else 1
+                collapse(
+                    trajectory,
+                    bit_position,
+                    bit,
+                    1 / np.sqrt(zero_norm if bit == 0 else one_norm),
+                )
+            else:
+                for kernel, args in steps:
+                    kernel(trajectory, *args)
+            for channel, bit_position in noise_channels:
+                channel.apply(trajectory, bit_position, rng)
+        total += np.abs(trajectory) ** 2
+    return total
+
+
+def simulate_trajectories(
+    circuit, noise, trajectories: int, state=None, processes=None, seed=None
+):
+    """
+    Simulate a `circuit` with `noise` (a `NoiseModel`), and return the average probability of each outcome over many `trajectories`.
+
+    The circuit starts in the given `state` (a `QuantumState` or vector), or in the all zero state by default.
+    Trajectories are split over a pool of `processes` (by default, one per CPU), each with an independent random number stream derived from `seed`.
+    Readout errors are applied to the returned probabilities.
+    """
+    if not isinstance(circuit, Circuit):
+        raise PyQubitsError("'circuit' must be a Circuit")
+    if not isinstance(noise, NoiseModel):
+        raise PyQubitsError("'noise' must be a NoiseModel")
+    if (not isinstance(trajectories, int)) or trajectories < 1:
+        raise PyQubitsError("'trajectories' must be a positive integer")
+    n = circuit._num_qubits
+    if state is None:
+        state = QuantumState.from_bits("0" * n)
+    elif not isinstance(state, QuantumState):
+        state = QuantumState.from_vector(state)
+    if state._num_qubits != n:
+        raise PyQubitsError(
+            "The state must have the same number of qubits as the circuit"
+        )
+    # A snapshot, so a state on a stabilizer tableau is not densified
+    vector = state._snapshot()
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, trajectories))
+    # Split the trajectories as evenly as possible between the processes
+    counts = [
+        trajectories // processes + (1 if i < trajectories % processes else 0)
+        for i in range(processes)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    if processes == 1:
+        total = _run_trajectories(circuit, noise, vector, trajectories, seeds[0])
+    else:
+        # Worker processes are spawned rather than forked, as forking a process that has run multithreaded kernels is unsafe
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            total = sum(
+                executor.map(
+                    _run_trajectories,
+                    [circuit] * processes,
+                    [noise] * processes,
+                    [vector] * processes,
+                    counts,
+                    seeds,
+                )
+            )
+    distribution = (total / trajectories).reshape((2,) * n)
+    # Readout errors mix the probabilities of each qubit being read as zero or one
+    for qubit in range(1, n + 1):
+        for readout_error in noise._readout_errors(qubit):
+            distribution = np.moveaxis(
+                np.tensordot(
+                    readout_error.matrix(), distribution, axes=([1], [qubit - 1])
+                ),
+                0,
+                qubit - 1,
+            )
+    return distribution.reshape(-1)
@@ -0,0 +1,170 @@
+from array import array
+from pyqubits.gates import (
+    X,
+    Y,
+    Z,
+    H,
+    P,
+    T,
+    CNOT,
+    CY,
+    CZ,
+    CH,
+    CP,
+    CT,
+    f2,
+    SWAP,
+    Unitary,
+    RX,
+    RY,
+    RZ,
+    U3,
+)
+
+
+# Gates drawn on a single qubit, gates drawn between a control and target qubit, and (single qubit) rotation gates
+_single_gates = {gate.__name__: gate for gate in [X, Y, Z, H, P, T]}
+_controlled_gates = {gate.__name__: gate for gate in [CNOT, CY, CZ, CH, CP, CT]}
+_rotation_gates = {gate.__name__: gate for gate in [RX, RY, RZ, U3]}
+# Every operation that can be logged, where each is stored as its index within this tuple
+NAMES = (
+    tuple(_single_gates)
+    + tuple(_controlled_gates)
+    + ("f2", "measure", "SWAP", "U")
+    + tuple(_rotation_gates)
+)
+_codes = {name: code for code, name in enumerate(NAMES)}
+
+
+def gate_rep(name, a, b):
+    """
+    The qubit that the drawing of an operation starts on, and the drawing itself.
+    """
+    if name in _single_gates:
+        return a, _single_gates[name].gate()
+    elif name in _rotation_gates:
+        return a, _rotation_gates[name].gate()
+    elif name in _controlled_gates:
+        return min(a, b), _controlled_gates[name].gate(a, b)
+    elif name == "f2":
+        return min(a, b), f2.gate(a, b)
+    elif name == "SWAP":
+        return min(a, b), SWAP.gate(a, b)
+    elif name == "U":
+        return min(a, b), Unitary.gate(a, b)
+    else:
+        # name == 'measure', with the measured bit drawn on the qubit
+        return a, [[str(b)]]
+
+
+def init_grid(num_qubits):
+    # Initialise circuit
+    grid = []
+    for i in range(0, num_qubits):
+        qubit_wire = []
+        qubit_wire.append(str((i + 1) % 10))
+        # Add the wire to the circuit
+        grid.append(qubit_wire)
+        # Add the empty space between wires to the circuit
+        grid.append([" "])
+    advance_grid(grid)
+    return grid
+
+
+def advance_grid(grid):
+    # Adds the space/wires between qubit operations in a circuit
+    for i, qubit_wire in enumerate(grid):
+        if (i % 2) == 0:
+            # We are on a qubit wire
+            qubit_wire.extend(["-", "-", "-"])
+        else:
+            # We are on empty space
+            qubit_wire.extend([" ", " ", " "])
+
+
+def update_grid(grid, num_qubits, start_qubit, gate_rep):
+    new_circuit = []
+    gate_length = len(gate_rep[0])
+    i = 0
+    while i < num_qubits:
+        if (i + 1) == start_qubit:
+            for row in gate_rep:
+                new_circuit.append(row)
+            new_circuit.append([" "] * gate_length)
+            i += int((len(gate_rep) + 1) / 2)
+        else:
+            new_circuit.append(["-"] * gate_length)
+            new_circuit.append([" "] * gate_length)
+            i += 1
+    for current_wire, new_wire in zip(grid, new_circuit):
+        if isinstance(new_wire, list):
+            current_wire.extend(new_wire)
+        else:
+            current_wire.append(new_wire)
+    advance_grid(grid)
+
+
+class OperationLog:
+    """
+    A compact record of the operations carried out on a quantum state.
+
+    Each operation is stored as three integers (its code, and up to two arguments), and the circuit diagram is only drawn when it is asked for.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_entries",
+        "_dropped",
+        "_prefix",
+    )
+
+    def __init__(self, num_qubits, prefix=None):
+        self._num_qubits = num_qubits
+        self._entries = array("i")
+        # Number of operations that have been discarded from the start of the log
+        self._dropped = 0
+        # An already drawn circuit that the logged operations follow on from
+        self._prefix = prefix
+
+    def __len__(self):
+        return len(self._entries) // 3
+
+    @property
+    def truncated(self):
+        """
+        Whether operations have been discarded from the start of the log.
+        """
+        return self._dropped > 0
+
+    def record(self, name, a, b=0, maxlen=None):
+        """
+        Add an operation to the log.
+
+        If `maxlen` is given, the oldest operations are discarded so that (at most) roughly twice that many operations are kept.
+        """
+        self._entries.extend((_codes[name], a, b))
+        if maxlen is not None and len(self) > 2 * maxlen:
+            # Discarding in bulk keeps the cost of each record constant
+            excess = len(self) - maxlen
+            del self._entries[: 3 * excess]
+            self._dropped += excess
+
+    def operations(self):
+        """
+        Iterate over the logged operations, as (name, a, b) tuples.
+        """
+        entries = self._entries
+        for i in range(0, len(entries), 3):
+            yield NAMES[entries[i]], entries[i + 1], entries[i + 2]
+
+    def grid(self):
+        """
+        Draw the circuit, as a list of rows (alternating between qubit wires and the space between them) of single characters.
+        """
+        if self._prefix is None or self.truncated:
+            grid = init_grid(self._num_qubits)
+        else:
+            grid = [list(row) for row in self._prefix]
+        for name, a, b in self.operations():
+            update_grid(grid, self._num_qubits, *gate_rep(name, a, b))
+        return grid
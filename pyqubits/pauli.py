@@ -0,0 +1,62 @@
+import numpy as np
+from numbers import Real
+from pyqubits.utils import PyQubitsError
+
+
+# A Pauli string is written with one character (I, X, Y or Z) for each qubit, such as 'ZIZ' for Z on the first and third qubits
+# It is stored as bitmasks of the qubits it flips (X or Y) and the qubits it adds a sign to (Z or Y), with the number of Ys
+
+
+def parse_pauli(pauli, num_qubits):
+    """
+    Return the bitmasks (and number of Ys) of the Pauli string `pauli`, for a state with `num_qubits` qubits.
+    """
+    if (
+        not isinstance(pauli, str)
+        or len(pauli) != num_qubits
+        or any([not c in "IXYZ" for c in pauli])
+    ):
+        raise PyQubitsError(
+            "Pauli strings must contain one of 'I', 'X', 'Y' or 'Z' for each qubit in the state"
+        )
+    x_mask = 0
+    z_mask = 0
+    for i, c in enumerate(pauli):
+        bit = 1 << (num_qubits - 1 - i)
+        if c in "XY":
+            x_mask |= bit
+        if c in "ZY":
+            z_mask |= bit
+    return x_mask, z_mask, pauli.count("Y")
+
+
+def parse_observable(observable, num_qubits):
+    """
+    Return the coefficients, bitmasks and numbers of Ys of an `observable`.
+
+    The observable is either a Pauli string, or a dictionary of Pauli strings and their (real) coefficients.
+    """
+    if isinstance(observable, str):
+        observable = {observable: 1.0}
+    if not isinstance(observable, dict) or len(observable) == 0:
+        raise PyQubitsError(
+            "'observable' must be either a Pauli string, or a dictionary of Pauli strings and coefficients"
+        )
+    coefficients = []
+    x_masks = []
+    z_masks = []
+    num_ys = []
+    for pauli, coefficient in observable.items():
+        if not isinstance(coefficient, Real):
+            raise PyQubitsError("The coefficients of 'observable' must be real numbers")
+        x_mask, z_mask, num_y = parse_pauli(pauli, num_qubits)
+        coefficients.append(coefficient)
+        x_masks.append(x_mask)
+        z_masks.append(z_mask)
+        num_ys.append(num_y)
+    return (
+        np.asarray(coefficients, dtype=np.float64),
+        np.asarray(x_masks, dtype=np.int64),
+        np.asarray(z_masks, dtype=np.int64),
+        np.asarray(num_ys, dtype=np.int64),
+    )
@@ -1,12 +1,41 @@
 import math
 import random
+import functools
 import numpy as np
+import numba as nb
 from numbers import Number
-from pyqubits.utils import PyQubitsError, validate_qubits, memkron
+from pyqubits.utils import (
+    PyQubitsError,
+    validate_qubits,
+    validate_qubit_list,
+    validate_dtype,
+    validate_angles,
+)
+from pyqubits.fusion import (
+    fuse,
+    to_phase,
+    f2_op,
+    phase_arrays,
+    permutation_args,
+)
+from pyqubits.storage import create_memmap, open_memmap, blocks
+from pyqubits.oplog import OperationLog, init_grid
+from pyqubits.kernels import (
+    apply_single,
+    apply_double,
+    apply_matrix,
+    apply_controlled,
+    apply_flip,
+    apply_swap,
+    apply_phases,
+    probabilities,
+    collapse,
+    pauli_expectation,
+    pauli_expectations,
+)
+from pyqubits.pauli import parse_observable
+from pyqubits.stabilizer import Tableau
 from pyqubits.gates import (
-    zero_matrix,
-    one_matrix,
-    I_matrix,
     X,
     Y,
     Z,
@@ -19,10 +48,53 @@ from pyqubits.gates import (
     CH,
     CP,
     CT,
-    f2,
+    Unitary,
+    RX,
+    RY,
+    RZ,
+    U3,
 )
 
 
+# The matrix of each gate, built once rather than on every gate call
+_gate_matrices = {
+    gate.__name__: gate.matrix()
+    for gate in [X, Y, Z, H, P, T, CNOT, CY, CZ, CH, CP, CT]
+}
+# The gates that can be applied by `QuantumState.apply`
+_single_gates = {gate.__name__: gate for gate in [X, Y, Z, H, P, T]}
+_controlled_gates = {gate.__name__: gate for gate in [CNOT, CY, CZ, CH, CP, CT]}
+_rotation_gates = {gate.__name__: gate for gate in [RX, RY, RZ, U3]}
+
+
+def _gate_op(name, *qubits):
+    # The operation of a fixed gate, where X and CNOT are flips (so are never matched against their matrices)
+    if name in ("X", "CNOT"):
+        return ("flip", qubits, 1)
+    return ("gate" if len(qubits) == 1 else "cgate", qubits, _gate_matrices[name])
+
+
+def _classical_vector(bits, dtype):
+    # The state vector of a single classical (basis) state, where only one amplitude is non-zero
+    state_vector = np.zeros(2 ** len(bits), dtype=dtype)
+    state_vector[int(bits, base=2)] = 1
+    return state_vector
+
+
+def _format_amplitude(amp):
+    # Format a complex amplitude, with spaces around its signs
+    return (
+        str(amp)
+        .replace("(", "")
+        .replace(")", "")
+        .replace(" ", "")
+        .replace("+", " + ")
+        .replace("-", " - ")
+        .replace("e - ", "e-")
+        .strip()
+    )
+
+
 class QuantumState:
     """
     A class for simulating multi-qubit states.
@@ -34,15 +106,32 @@ class QuantumState:
         "_state_vector",
         "_bit",
         "_circuit",
+        "_lazy",
+        "_pending",
+        "_tableau",
+        "_recording",
     )
     # Rounding accuracy
     decimal_places = 16
+    # Precision of state vectors, when not given on construction ('complex64' or 'complex128')
+    default_dtype = "complex128"
+    # Size (in qubits) of the chunks that a state vector stored in a file is streamed through memory in
+    chunk_qubits = 20
     # How many characters (length-wise) of the circuit can be printed
     max_visible_circuit = 200
+    # Whether operations are logged, so that the circuit can be drawn
+    record_circuit = True
+    # Whether only the latest operations (enough to draw the visible part of the circuit) are kept in the log
+    bounded_circuit = False
+    # Whether classical states (from `from_bits`) are simulated with a stabilizer tableau, until a non-Clifford gate is applied
+    stabilizer = True
+    # The number of qubits a classical state needs for the tableau to be used, as smaller state vectors are cheaper to update directly
+    stabilizer_qubits = 20
 
-    def __init__(self, n: int = 1):
+    def __init__(self, n: int = 1, dtype=None):
         if (not isinstance(n, int)) or n < 1:
             raise PyQubitsError("'n' must be a positive integer")
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
         self._num_qubits = n
         self._num_classical_states = 2**self._num_qubits
         # A state vector is created with random values from the unit circle around the origin
@@ -51,44 +140,87 @@ class QuantumState:
             + (2 * np.random.random(self._num_classical_states) - 1) * 1j
         )  # complex128
         # The vector is normalised
-        self._state_vector = self._state_vector / np.linalg.norm(self._state_vector)
+        self._state_vector = (
+            self._state_vector / np.linalg.norm(self._state_vector)
+        ).astype(dtype, copy=False)
         self._bit = None
+        self._lazy = False
+        self._pending = []
+        self._tableau = None
+        # Whether this state's operations are logged (as well as `record_circuit` being set)
+        self._recording = True
         self._init_circuit()
 
     @classmethod
-    def from_bits(cls, bits: str):
-        if not isinstance(bits, str) or any([not c in "01q" for c in bits]):
+    def from_bits(cls, bits: str, dtype=None, path=None):
+        """
+        Construct a `QuantumState` object from a string of '0', '1' and 'q' (random) qubits.
+
+        If a `path` is given, the state vector is stored in a file at that path, rather than in memory.
+        """
+        if not isinstance(bits, str) or len(bits) == 0 or any([not c in "01q" for c in bits]):
             raise PyQubitsError(f"'bits' must be a binary number string")
-        obj = cls()
-        for i, c in enumerate(bits):
-            obj_ = cls()
-            if c == "0":
-                # Create the zero qubit
-                obj_._state_vector = np.zeros(2) + np.zeros(2) * 1j  # complex128
-                obj_._state_vector[0] = 1
-            elif c == "1":
-                # Create the one qubit
-                obj_._state_vector = np.zeros(2) + np.zeros(2) * 1j  # complex128
-                obj_._state_vector[-1] = 1
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
+        if path is not None:
+            vector = create_memmap(path, 2 ** len(bits), dtype)
+            if all(c != "q" for c in bits):
+                # The file starts zeroed, so only the single non-zero amplitude needs writing
+                vector[int(bits, base=2)] = 1
             else:
-                # c == 'q'
-                # Therefore, create a random qubit
-                obj_._state_vector = np.asarray(
-                    (2 * np.random.random(2) - 1) + (2 * np.random.random(2) - 1) * 1j
-                )  # complex128
-                obj_._state_vector = obj_._state_vector / np.linalg.norm(
-                    obj_._state_vector
+                # The vector is the product of the vectors for its leading and trailing qubits
+                # So it can be written one chunk (of the trailing qubits) at a time
+                split = max(len(bits) - QuantumState.chunk_qubits, 0)
+                tail = cls.from_bits(bits[split:], dtype=dtype)._state_vector
+                head = (
+                    cls.from_bits(bits[:split], dtype=dtype)._state_vector
+                    if split > 0
+                    else np.ones(1, dtype=dtype)
                 )
-            if i == 0:
-                # Set the state equal to this qubit, because it is the first one
-                obj = obj_
-            else:
-                # This qubit is not the first, so combine it with the state
-                obj *= obj_
-        return obj
+                for i, amplitude in enumerate(head):
+                    vector[i * len(tail) : (i + 1) * len(tail)] = amplitude * tail
+            vector.flush()
+            return cls._from_state_vector(vector)
+        if all(c != "q" for c in bits):
+            if (
+                QuantumState.stabilizer
+                and len(bits) >= QuantumState.stabilizer_qubits
+            ):
+                # The state vector is only built if (and when) a non-Clifford gate is applied
+                obj = cls(dtype=dtype)
+                obj._num_qubits = len(bits)
+                obj._num_classical_states = 2**obj._num_qubits
+                obj._state_vector = None
+                obj._tableau = Tableau(bits, dtype)
+                obj._init_circuit()
+                return obj
+            state_vector = _classical_vector(bits, dtype)
+        else:
+            # The state is the product of each qubit's state, so is built by one outer product
+            qubit_vectors = []
+            for c in bits:
+                if c == "0":
+                    # Create the zero qubit
+                    qubit_vectors.append(np.asarray([1 + 0j, 0 + 0j]))
+                elif c == "1":
+                    # Create the one qubit
+                    qubit_vectors.append(np.asarray([0 + 0j, 1 + 0j]))
+                else:
+                    # c == 'q'
+                    # Therefore, create a random qubit
+                    qubit_vector = np.asarray(
+                        (2 * np.random.random(2) - 1)
+                        + (2 * np.random.random(2) - 1) * 1j
+                    )  # complex128
+                    qubit_vectors.append(qubit_vector / np.linalg.norm(qubit_vector))
+            state_vector = (
+                functools.reduce(np.multiply.outer, qubit_vectors)
+                .reshape(-1)
+                .astype(dtype, copy=False)
+            )
+        return cls._from_state_vector(state_vector)
 
     @classmethod
-    def from_vector(cls, vector: np.ndarray):
+    def from_vector(cls, vector: np.ndarray, dtype=None):
         """
         Construct a `QuantumState` object from a vector (this could be a NumPy array or a list).
         The vector is normalised to ensure it is a valid state.
@@ -106,12 +238,13 @@ class QuantumState:
                 raise PyQubitsError(
                     f"Elements of 'vector' must be numbers. Encountered invalid type: {type(x).__name__}"
                 )
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
         # The state vector is created
-        state_vector = np.asarray(vector, dtype="complex128")
+        state_vector = np.asarray(vector, dtype=dtype)
         # The vector is normalised
         state_vector = state_vector / np.linalg.norm(state_vector)
         # The QuantumState is created with the state vector
-        obj = cls()
+        obj = cls(dtype=dtype)
         obj._num_qubits = int(math.log2(len(state_vector)))
         obj._num_classical_states = 2**obj._num_qubits
         obj._state_vector = state_vector
@@ -119,64 +252,75 @@ class QuantumState:
         obj._init_circuit()
         return obj
 
+    @classmethod
+    def from_file(cls, path, dtype=None):
+        """
+        Construct a `QuantumState` object from a state vector stored in the file at `path` (such as one written by `vector.tofile(path)`).
+
+        The vector stays in the file, and is streamed through memory in chunks whenever it is changed.
+        The vector is normalised to ensure it is a valid state.
+        """
+        dtype = validate_dtype(QuantumState.default_dtype if dtype is None else dtype)
+        vector = open_memmap(path, dtype)
+        norm = math.sqrt(
+            sum(
+                np.vdot(block, block).real
+                for block, _ in blocks(vector, (), QuantumState.chunk_qubits, write=False)
+            )
+        )
+        for block, _ in blocks(vector, (), QuantumState.chunk_qubits):
+            block /= norm
+        vector.flush()
+        return cls._from_state_vector(vector)
+
+    @classmethod
+    def _from_state_vector(cls, vector):
+        # Construct a `QuantumState` object directly from a (normalised) state vector
+        obj = cls(dtype=vector.dtype)
+        obj._num_qubits = int(math.log2(len(vector)))
+        obj._num_classical_states = 2**obj._num_qubits
+        obj._state_vector = vector
+        obj._bit = None
+        obj._init_circuit()
+        return obj
+
     def _init_circuit(self):
-        # Initialise circuit
-        self._circuit = []
-        for i in range(0, self._num_qubits):
-            qubit_wire = []
-            qubit_wire.append(str((i + 1) % 10))
-            # Add the wire to the circuit
-            self._circuit.append(qubit_wire)
-            # Add the empty space between wires to the circuit
-            self._circuit.append([" "])
-        self._advance_circuit()
-
-    def _advance_circuit(self):
-        # Adds the space/wires between qubit operations in a circuit
-        for i, qubit_wire in enumerate(self._circuit):
-            if (i % 2) == 0:
-                # We are on a qubit wire
-                qubit_wire.extend(["-", "-", "-"])
-            else:
-                # We are on empty space
-                qubit_wire.extend([" ", " ", " "])
-
-    def _update_circuit(self, start_qubit, gate_rep):
-        new_circuit = []
-        gate_length = len(gate_rep[0])
-        i = 0
-        while i < self._num_qubits:
-            if (i + 1) == start_qubit:
-                for row in gate_rep:
-                    new_circuit.append(row)
-                new_circuit.append([" "] * gate_length)
-                i += int((len(gate_rep) + 1) / 2)
-            else:
-                new_circuit.append(["-"] * gate_length)
-                new_circuit.append([" "] * gate_length)
-                i += 1
-        for current_wire, new_wire in zip(self._circuit, new_circuit):
-            if isinstance(new_wire, list):
-                current_wire.extend(new_wire)
-            else:
-                current_wire.append(new_wire)
-        self._advance_circuit()
+        # Initialise the log of operations that the circuit is drawn from
+        self._circuit = OperationLog(self._num_qubits)
+
+    def _record(self, name, a, b=0):
+        # Log an operation, so that it can be drawn on the circuit
+        if QuantumState.record_circuit and self._recording:
+            self._circuit.record(
+                name,
+                a,
+                b,
+                maxlen=(
+                    QuantumState.max_visible_circuit // 4 + 1
+                    if QuantumState.bounded_circuit
+                    else None
+                ),
+            )
 
     def __mul__(self, s):
+        self._flush()
+        s._flush()
         joined = QuantumState()
         joined._num_qubits = self._num_qubits + s._num_qubits
         joined._num_classical_states = 2**joined._num_qubits
         joined._state_vector = np.kron(self._state_vector, s._state_vector)
         joined._bit = None
-        joined._init_circuit()
+        joined_circuit = init_grid(joined._num_qubits)
+        self_circuit = self._circuit.grid()
+        s_circuit = s._circuit.grid()
         remaining_circuit = []
         # Difference in number of columns in the circuits
-        circuit_length_diff = len(self._circuit[0]) - len(s._circuit[0])
+        circuit_length_diff = len(self_circuit[0]) - len(s_circuit[0])
         # For each row in the self state's circuit
-        for i in range(len(self._circuit)):
+        for i in range(len(self_circuit)):
             if (i % 2) == 0:
                 # We are on a qubit wire, and not empty space
-                wire = list(self._circuit[i])
+                wire = list(self_circuit[i])
                 if circuit_length_diff < 0:
                     # The length of the self state is less than the other state
                     # So the self state's circuit must be extended by the difference
@@ -186,15 +330,15 @@ class QuantumState:
                 remaining_circuit.append(wire[4:])
             else:
                 # We are on empty space
-                space = list(self._circuit[i])
+                space = list(self_circuit[i])
                 if circuit_length_diff < 0:
                     space.extend([" "] * abs(circuit_length_diff))
                 remaining_circuit.append(space[4:])
         # For each row in the other state's circuit
-        for i in range(len(s._circuit)):
+        for i in range(len(s_circuit)):
             if (i % 2) == 0:
                 # We are on a qubit wire, and not empty space
-                wire = list(s._circuit[i])
+                wire = list(s_circuit[i])
                 if circuit_length_diff > 0:
                     # The length of the self state is greater than the other state
                     # So the other state's circuit must be extended by the difference
@@ -204,51 +348,144 @@ class QuantumState:
                 remaining_circuit.append(wire[4:])
             else:
                 # We are on empty space
-                space = list(s._circuit[i])
+                space = list(s_circuit[i])
                 if circuit_length_diff > 0:
                     space.extend([" "] * circuit_length_diff)
                 remaining_circuit.append(space[4:])
         # Add the rest of the circuit to the new joint circuit
         for i, row in enumerate(remaining_circuit):
-            joined._circuit[i].extend(row)
+            joined_circuit[i].extend(row)
+        # The joined state's operations are logged after the circuit drawn so far
+        joined._circuit = OperationLog(joined._num_qubits, prefix=joined_circuit)
         return joined
 
-    def __str__(self):
-        amplitudes = []
-        for amp in self._state_vector:
-            amplitudes.append(
-                str(amp)
-                .replace("(", "")
-                .replace(")", "")
-                .replace(" ", "")
-                .replace("+", " + ")
-                .replace("-", " - ")
-                .replace("e - ", "e-")
-                .strip()
-            )
-        longest_amp = 0
-        for amp in amplitudes:
-            if len(amp) > longest_amp:
-                longest_amp = len(amp)
-        for i, amp in enumerate(amplitudes):
-            diff = longest_amp - len(amp)
-            if diff != 0:
-                amplitudes[i] = (" " * diff) + amplitudes[i]
-        basis = [
-            bin(i)[2:].zfill(self._num_qubits)
-            for i in range(self._num_classical_states)
-        ]
+    def _render(self, indices, first=True, width=0):
+        # Format the amplitudes at the given indices as 'amplitude |basis state>' terms, two per line
+        amplitudes = [_format_amplitude(amp) for amp in self._state_vector[indices]]
+        longest_amp = max([width] + [len(amp) for amp in amplitudes])
         state_string = ""
-        first_non_zero = True
+        first_non_zero = first
         first_on_line = True
-        for i, (amplitude, vector) in enumerate(zip(amplitudes, basis)):
-            if self._state_vector[i] != 0:
-                state_string += f"{'=' if first_non_zero else '+'} ({amplitude}) |{vector}> {chr(10) if not first_on_line else ''}"
-                first_non_zero = False
-                first_on_line = not first_on_line
+        for i, amplitude in zip(indices, amplitudes):
+            amplitude = amplitude.rjust(longest_amp)
+            vector = bin(i)[2:].zfill(self._num_qubits)
+            state_string += f"{'=' if first_non_zero else '+'} ({amplitude}) |{vector}> {chr(10) if not first_on_line else ''}"
+            first_non_zero = False
+            first_on_line = not first_on_line
         return state_string[:-1] if state_string[-1] == "\n" else state_string
 
+    def _chunks(self):
+        # Iterate over the state vector a chunk at a time, yielding the start of each chunk and its amplitudes
+        # A state vector stored in a file is therefore never loaded into memory all at once
+        chunk = 1 << min(self._num_qubits, QuantumState.chunk_qubits)
+        for start in range(0, self._num_classical_states, chunk):
+            yield start, self._state_vector[start : start + chunk]
+
+    def __str__(self):
+        self._flush()
+        # Zero amplitudes are not shown, but the amplitudes are still padded to the width of the widest zero
+        # There are only four kinds of zero (from the signs of the real and imaginary parts), so only one of each is formatted
+        zeros = {}
+        indices = []
+        for start, block in self._chunks():
+            block_zeros = block[block == 0]
+            kinds, first = np.unique(
+                2 * np.signbit(block_zeros.real) + np.signbit(block_zeros.imag),
+                return_index=True,
+            )
+            for kind, i in zip(kinds, first):
+                zeros.setdefault(kind, block_zeros[i])
+            indices.append(start + np.nonzero(block)[0])
+        width = max([len(_format_amplitude(z)) for z in zeros.values()], default=0)
+        return self._render(np.concatenate(indices), width=width)
+
+    def pages(self, page_size: int = 64, threshold: float = 0.0):
+        """
+        Iterate over the printable quantum state, `page_size` amplitudes at a time.
+
+        Only amplitudes with a probability greater than `threshold` are shown.
+        The state is searched a chunk at a time, so the first pages of a large state are available straight away.
+        """
+        if (not isinstance(page_size, int)) or page_size < 1:
+            raise PyQubitsError("'page_size' must be a positive integer")
+        self._flush()
+        page = np.zeros(0, dtype=np.int64)
+        first = True
+        for start, block in self._chunks():
+            page = np.concatenate(
+                [page, start + np.nonzero(np.abs(block) ** 2 > threshold)[0]]
+            )
+            while len(page) >= page_size:
+                yield self._render(page[:page_size], first=first)
+                first = False
+                page = page[page_size:]
+        if len(page) > 0:
+            yield self._render(page, first=first)
+
+    def amplitude(self, bits: str):
+        """
+        The amplitude of the basis state given by the binary number string `bits`.
+        """
+        self._flush()
+        return self._state_vector[self._basis_index(bits)]
+
+    def probability(self, bits: str):
+        """
+        The probability of measuring the basis state given by the binary number string `bits`, if every qubit is measured.
+        """
+        return abs(self.amplitude(bits)) ** 2
+
+    def amplitudes(self, threshold: float = 0.0):
+        """
+        Dictionary of the basis states (as binary number strings) and amplitudes, for every amplitude with a probability greater than `threshold`.
+        """
+        self._flush()
+        amplitudes = {}
+        for start, block in self._chunks():
+            indices = np.nonzero(np.abs(block) ** 2 > threshold)[0]
+            for i, amp in zip(indices, block[indices]):
+                amplitudes[bin(start + i)[2:].zfill(self._num_qubits)] = amp
+        return amplitudes
+
+    def top(self, k: int):
+        """
+        List of the `k` most likely basis states (as binary number strings) and their amplitudes, from most to least likely.
+        """
+        if (not isinstance(k, int)) or k < 1:
+            raise PyQubitsError("'k' must be a positive integer")
+        self._flush()
+        k = min(k, self._num_classical_states)
+        # The k largest probabilities of each chunk are kept, alongside the k largest found so far
+        indices = np.zeros(0, dtype=np.int64)
+        probabilities = np.zeros(0)
+        for start, block in self._chunks():
+            block_probabilities = np.abs(block) ** 2
+            best = np.argpartition(block_probabilities, -min(k, len(block)))[-k:]
+            indices = np.concatenate([indices, start + best])
+            probabilities = np.concatenate([probabilities, block_probabilities[best]])
+            if len(indices) > k:
+                best = np.argpartition(probabilities, -k)[-k:]
+                indices, probabilities = indices[best], probabilities[best]
+        # Only the k largest probabilities are sorted
+        order = np.lexsort((indices, -probabilities))
+        indices = indices[order]
+        return [
+            (bin(i)[2:].zfill(self._num_qubits), self._state_vector[i]) for i in indices
+        ]
+
+    def _basis_index(self, bits):
+        if (
+            not isinstance(bits, str)
+            or len(bits) != self._num_qubits
+            or any([not c in "01" for c in bits])
+        ):
+            raise PyQubitsError(
+                "'bits' must be a binary number string, with one bit for each qubit in the state"
+            )
+        return int(bits, base=2)
+
     def __repr__(self):
+        self._flush()
         return (
             "QuantumState("
             + f"\n{' ' * (len('QuantumState(') - len('array('))}".join(
@@ -262,8 +499,25 @@ class QuantumState:
         """
         NumPy array of the state vector.
         """
+        self._flush()
         return self._state_vector
 
+    @property
+    def dtype(self):
+        """
+        NumPy dtype of the state vector (either complex64 or complex128).
+        """
+        if self._tableau is not None:
+            return self._tableau.dtype
+        return self._state_vector.dtype
+
+    @property
+    def backend(self):
+        """
+        How the quantum state is currently simulated: 'stabilizer' (a stabilizer tableau) or 'vector' (a state vector).
+        """
+        return "stabilizer" if self._tableau is not None else "vector"
+
     @property
     def dist(self):
         """
@@ -271,15 +525,13 @@ class QuantumState:
 
         The distribution shows the probability of each outcome if every qubit in the quantum state is measured.
         """
-        dist_string = ""
-        gen_classical_states = (
-            (i, bin(i)[2:].zfill(self._num_qubits))
-            for i in range(self._num_classical_states)
-        )
-        for i, bin_i in gen_classical_states:
-            rounded_probability = round(abs(self._state_vector[i]) ** 2, 2)
-            dist_string += f"{bin_i}\t{rounded_probability}\t|{'=' * int(100 * rounded_probability)}\n"  # type: ignore
-        return dist_string[:-1]
+        self._flush()
+        rounded_probabilities = np.round(np.abs(self._state_vector) ** 2, 2)
+        dist_lines = [
+            f"{bin(i)[2:].zfill(self._num_qubits)}\t{rounded_probability}\t|{'=' * int(100 * rounded_probability)}"
+            for i, rounded_probability in enumerate(rounded_probabilities)
+        ]
+        return "\n".join(dist_lines)
 
     @property
     def circuit(self):
@@ -288,20 +540,23 @@ class QuantumState:
 
         The quantum circuit shows all actions that have been carried out on the quantum state.
         """
+        circuit = self._circuit.grid()
         circuit_string = ""
-        if len(self._circuit[0]) - 4 > QuantumState.max_visible_circuit:
+        if (
+            len(circuit[0]) - 4 > QuantumState.max_visible_circuit
+            or self._circuit.truncated
+        ):
             for i in range(
-                len(self._circuit) - 1
+                len(circuit) - 1
             ):  # We don't want to print the last line of empty space
-                circuit_string += self._circuit[i][0] + "..."
+                circuit_string += circuit[i][0] + "..."
                 circuit_string += (
                     "".join(
-                        self._circuit[i][
+                        circuit[i][
                             4
-                            + (
-                                len(self._circuit[0])
-                                - QuantumState.max_visible_circuit
-                                - 4
+                            + max(
+                                len(circuit[0]) - QuantumState.max_visible_circuit - 4,
+                                0,
                             ) :
                         ]
                     )
@@ -309,9 +564,9 @@ class QuantumState:
                 )
         else:
             for i in range(
-                len(self._circuit) - 1
+                len(circuit) - 1
             ):  # We don't want to print the last line of empty space
-                circuit_string += "".join(self._circuit[i]) + "\n"
+                circuit_string += "".join(circuit[i]) + "\n"
         return circuit_string[:-1]
 
     @property
@@ -320,12 +575,17 @@ class QuantumState:
         Printable quantum circuit diagram (in full).
 
         The quantum circuit shows all actions that have been carried out on the quantum state.
+        If only the latest operations have been kept (see `bounded_circuit`), then only they are shown.
         """
+        circuit = self._circuit.grid()
         circuit_string = ""
         for i in range(
-            len(self._circuit) - 1
+            len(circuit) - 1
         ):  # We don't want to print the last line of empty space
-            circuit_string += "".join(self._circuit[i]) + "\n"
+            if self._circuit.truncated:
+                circuit_string += circuit[i][0] + "..." + "".join(circuit[i][4:]) + "\n"
+            else:
+                circuit_string += "".join(circuit[i]) + "\n"
         return circuit_string[:-1]
 
     @property
@@ -333,124 +593,317 @@ class QuantumState:
         """
         The outcome of the latest measurement of the quantum state.
         """
+        if self._tableau is None:
+            self._flush()
         return self._bit
 
-    def _apply_gate(self, *args, gate):
-        gates = []
-        gate_sizes = []
-        gate_at_pos = []
-        gate_num = 0
-        for i in range(1, self._num_qubits + 1):
-            if i == args[0]:  # First qubit
-                gates.append(gate)
-                gate_sizes.append(len(gate))
-                gate_at_pos.append(gate_num)
-            elif (
-                i == args[-1]
-            ):  # Last qubit, or in the case of len(args) = 1, also the first qubit
-                gate_at_pos.append(gate_num)
-                gate_num += 1
-            else:
-                gates.append(
-                    np.pad(I_matrix, (0, len(gate) - len(I_matrix)), mode="constant")
-                )
-                gate_sizes.append(len(I_matrix))
-                gate_at_pos.append(gate_num)
-                gate_num += 1
-        binary_values = []
-        for i in range(self._num_classical_states):
-            position = 0
-            bin_list = []
-            current_bin = bin(i)[2:].zfill(self._num_qubits)
-            while position < self._num_qubits:
-                num_qubits_for_gate = int(math.log2(gate_sizes[gate_at_pos[position]]))
-                bin_list.append(
-                    int(current_bin[position : position + num_qubits_for_gate], base=2)
-                )
-                position += num_qubits_for_gate
-            binary_values.append(bin_list)
-        gates = np.asarray(gates)
-        binary_values = np.asarray(binary_values)
-        self._state_vector = np.asarray(
-            memkron(gates, self._state_vector, binary_values)
-        )
+    @property
+    def lazy(self):
+        """
+        Whether gates are queued rather than applied immediately.
 
-    def _apply_cgate(self, control, target, gate):
-        gates_a = []
-        gates_b = []
-        for i in range(1, self._num_qubits + 1):
-            if i == control:
-                gates_a.append(zero_matrix)
-                gates_b.append(one_matrix)
-            elif i == target:
-                gates_a.append(I_matrix)
-                gates_b.append(gate)
-            else:
-                gates_a.append(I_matrix)
-                gates_b.append(I_matrix)
-        gates_a = np.asarray(gates_a)
-        gates_b = np.asarray(gates_b)
-        binary_values = np.asarray(
-            [
-                [int(x) for x in bin(i)[2:].zfill(self._num_qubits)]
-                for i in range(self._num_classical_states)
-            ]
-        )
-        state_vector_a = np.asarray(memkron(gates_a, self._state_vector, binary_values))
-        state_vector_b = np.asarray(memkron(gates_b, self._state_vector, binary_values))
-        self._state_vector = np.add(state_vector_a, state_vector_b)
+        Queued gates are fused together, and applied when the quantum state is next accessed or measured.
+        """
+        return self._lazy
 
-    def _apply_measure(self, qubit):
-        gates_zero = []
-        gates_one = []
-        for i in range(1, self._num_qubits + 1):
-            if i == qubit:
-                gates_zero.append(zero_matrix)
-                gates_one.append(one_matrix)
-            else:
-                gates_zero.append(I_matrix)
-                gates_one.append(I_matrix)
-        gates_zero = np.asarray(gates_zero)
-        gates_one = np.asarray(gates_one)
-        binary_values = np.asarray(
-            [
-                [int(x) for x in bin(i)[2:].zfill(self._num_qubits)]
-                for i in range(self._num_classical_states)
-            ]
+    @lazy.setter
+    def lazy(self, value):
+        if not isinstance(value, bool):
+            raise PyQubitsError("'lazy' must be a boolean")
+        if not value and self._tableau is None:
+            self._flush()
+        self._lazy = value
+
+    def _probabilities(self, qubits=None):
+        self._flush()
+        if qubits is None:
+            # Probability of each outcome when measuring every qubit
+            # This has an entry for every amplitude, so is built in memory even for a state stored in a file
+            return np.abs(self._state_vector) ** 2
+        # Sum out the unwanted qubits a chunk at a time, treating each qubit as an axis of a (2, 2, ..., 2) tensor
+        # Within a chunk, only the lowest qubits vary, and the highest qubits are fixed
+        n = self._num_qubits
+        chunk_bits = min(n, QuantumState.chunk_qubits)
+        sorted_qubits = sorted(qubits)
+        high = [q for q in sorted_qubits if q <= n - chunk_bits]
+        others = tuple(
+            i for i in range(chunk_bits) if (n - chunk_bits + i + 1) not in qubits
         )
-        # Determine measurement vectors
-        collapsed_zero = np.asarray(
-            memkron(gates_zero, self._state_vector, binary_values)
+        marginal = np.zeros((2,) * len(qubits))
+        for start, block in self._chunks():
+            tensor = (np.abs(block) ** 2).reshape((2,) * chunk_bits)
+            marginal[tuple((start >> (n - q)) & 1 for q in high)] += tensor.sum(
+                axis=others
+            )
+        # The remaining axes are in increasing qubit order, so they are rearranged into the order given
+        marginal = marginal.transpose([sorted_qubits.index(q) for q in qubits])
+        return marginal.reshape(-1)
+
+    def marginal(self, qubits):
+        """
+        NumPy array of the probability of each outcome, if only the `qubits` (a list of qubits) are measured.
+
+        The outcomes are ordered as binary numbers, with the first of the `qubits` as the most significant bit.
+        """
+        validate_qubit_list(qubits, self._num_qubits)
+        return self._probabilities(qubits)
+
+    def reduced_density_matrix(self, qubits):
+        """
+        NumPy array of the density matrix of the `qubits` (a list of qubits), once every other qubit is traced out.
+
+        The rows and columns are ordered as binary numbers, with the first of the `qubits` as the most significant bit.
+        """
+        validate_qubit_list(qubits, self._num_qubits)
+        self._flush()
+        tensor = self._state_vector.reshape((2,) * self._num_qubits)
+        others = [i for i in range(self._num_qubits) if (i + 1) not in qubits]
+        # Contracting the state with its conjugate over the other qubits traces them out
+        # The remaining axes are the kept qubits (in increasing order) of the state, then of its conjugate
+        matrix = np.tensordot(tensor, tensor.conj(), axes=(others, others))
+        sorted_qubits = sorted(qubits)
+        order = [sorted_qubits.index(q) for q in qubits]
+        matrix = matrix.transpose(order + [len(qubits) + i for i in order])
+        return matrix.reshape(2 ** len(qubits), 2 ** len(qubits))
+
+    def entanglement_entropy(self, qubits, base=2):
+        """
+        The entanglement (von Neumann) entropy between the `qubits` (a list of qubits) and the rest of the quantum state.
+
+        The entropy is measured in bits by default, or in the units of the logarithm `base` given.
+        """
+        eigenvalues = np.linalg.eigvalsh(self.reduced_density_matrix(qubits))
+        # Zero (or slightly negative, from rounding) eigenvalues contribute nothing
+        eigenvalues = eigenvalues[eigenvalues > 1e-15]
+        return float(-np.sum(eigenvalues * np.log(eigenvalues)) / np.log(base))
+
+    def sample(self, shots: int, qubits=None, counts=True):
+        """
+        Sample `shots` measurement outcomes of the `qubits` (by default, every qubit) without collapsing the quantum state.
+
+        If `counts` is true, a dictionary of each observed bitstring and its number of occurrences is returned.
+        Otherwise, a NumPy array of the outcomes is returned, with each outcome as an integer (the first qubit being the most significant bit).
+        """
+        if (not isinstance(shots, int)) or shots < 1:
+            raise PyQubitsError("'shots' must be a positive integer")
+        if qubits is not None:
+            validate_qubit_list(qubits, self._num_qubits)
+        distribution = self._probabilities(qubits)
+        # Draw every shot at once, by searching the cumulative distribution
+        cumulative = np.cumsum(distribution)
+        outcomes = np.searchsorted(
+            cumulative, np.random.random(shots) * cumulative[-1], side="right"
         )
-        collapsed_one = np.asarray(
-            memkron(gates_one, self._state_vector, binary_values)
+        outcomes = np.minimum(outcomes, len(distribution) - 1)
+        if not counts:
+            return outcomes
+        num_bits = self._num_qubits if qubits is None else len(qubits)
+        occurrences = np.bincount(outcomes, minlength=len(distribution))
+        return {
+            bin(i)[2:].zfill(num_bits): int(occurrences[i])
+            for i in np.nonzero(occurrences)[0]
+        }
+
+    def expectation(self, observable):
+        """
+        The expectation value of an `observable`, which is either a Pauli string (such as 'ZIZ') or a dictionary of Pauli strings and their coefficients (such as {'ZZI': 0.5, 'IXX': -1.0}).
+
+        Each Pauli string is evaluated directly on the state vector (using bitmasks), without copying it.
+        """
+        self._flush()
+        coefficients, x_masks, z_masks, num_ys = parse_observable(
+            observable, self._num_qubits
         )
+        if len(coefficients) >= nb.get_num_threads():
+            # There are enough Pauli strings to spread them over every thread
+            values = pauli_expectations(self._state_vector, x_masks, z_masks, num_ys)
+        else:
+            values = np.asarray(
+                [
+                    pauli_expectation(self._state_vector, x, z, y)
+                    for x, z, y in zip(x_masks, z_masks, num_ys)
+                ]
+            )
+        return float(np.dot(coefficients, values))
+
+    def _apply(self, op, name=None):
+        if self._tableau is not None:
+            if self._tableau.apply(op, name):
+                return
+            # A non-Clifford gate has been applied, so the state vector is needed from now on
+            self._densify()
+        if self._lazy:
+            self._pending.append(op)
+        else:
+            self._execute(op)
+
+    def _execute(self, op):
+        kind, qubits, gate = to_phase(op)
+        if kind in ("flip", "swap"):
+            # Gates that only permute the basis states are applied by swapping amplitudes, with no arithmetic
+            self._run_kernel(
+                apply_flip if kind == "flip" else apply_swap,
+                *permutation_args((kind, qubits, gate), self._num_qubits),
+            )
+            return
+        if kind == "phase":
+            # Diagonal gates only multiply each amplitude by a phase, which is done in a single pass over the state
+            self._run_kernel(
+                apply_phases,
+                *phase_arrays(gate, self._num_qubits, self._state_vector.dtype),
+            )
+            return
+        # The gate is given the same precision as the state, so the kernel runs entirely in that precision
+        gate = np.asarray(gate, dtype=self._state_vector.dtype)
+        # The gate is applied in place, by walking the pairs (or quadruples) of amplitudes it mixes
+        bits = tuple(self._num_qubits - qubit for qubit in qubits)
+        if kind == "cgate":
+            # Only the half of the state where the control qubit is one is updated
+            self._run_kernel(apply_controlled, gate, *bits)
+        elif len(qubits) == 1:
+            self._run_kernel(apply_single, gate, *bits)
+        elif len(qubits) == 2:
+            self._run_kernel(apply_double, gate, *bits)
+        else:
+            # Larger gates are contracted with the state, which is viewed as a tensor with an axis for each qubit
+            self._run_kernel(apply_matrix, gate, *bits)
+
+    def _run_kernel(self, kernel, gate, *bits):
+        if isinstance(self._state_vector, np.memmap) and kernel is apply_phases:
+            # The positions of a phase operation are stored in an array, which is translated to the positions within each block
+            positions = bits[0]
+            used = tuple(sorted(set(positions[positions >= 0].tolist())))
+            for block, local_bits in blocks(
+                self._state_vector, used, QuantumState.chunk_qubits
+            ):
+                local = dict(zip(used, local_bits))
+                local[-1] = -1
+                local_positions = np.asarray(
+                    [[local[bit] for bit in row] for row in positions.tolist()],
+                    dtype=np.int64,
+                )
+                kernel(block, gate, local_positions)
+        elif isinstance(self._state_vector, np.memmap):
+            # The state is stored in a file, so is streamed through memory in chunks
+            for block, local_bits in blocks(
+                self._state_vector, bits, QuantumState.chunk_qubits
+            ):
+                kernel(block, gate, *local_bits)
+        else:
+            kernel(self._state_vector, gate, *bits)
+
+    def _densify(self):
+        # Build the state vector of a state simulated by a stabilizer tableau (which only fixes the state up to a global phase)
+        tableau = self._tableau
+        self._tableau = None
+        self._state_vector = tableau.vector()
+
+    def _snapshot(self):
+        # A copy of the state vector, built without changing how the state is simulated (so a tableau is kept)
+        if self._tableau is not None:
+            return self._tableau.vector()
+        self._flush()
+        return np.array(self._state_vector)
+
+    def _flush(self):
+        if self._tableau is not None:
+            self._densify()
+        # Apply any queued gates, fusing those that act on the same qubit(s)
+        if self._pending:
+            for op in fuse(self._pending):
+                self._execute(op)
+            self._pending = []
+
+    def _apply_gate(self, *args, gate, name=None):
+        self._apply(("gate", args, gate), name)
+
+    def _apply_cgate(self, control, target, gate, name=None):
+        self._apply(("cgate", (control, target), gate), name)
+
+    def _decimal_places(self):
+        # Single precision states cannot be rounded as accurately as double precision states
+        if self._state_vector.dtype == np.complex64:
+            return min(QuantumState.decimal_places, np.finfo(np.float32).precision + 1)
+        return QuantumState.decimal_places
+
+    def _apply_measure(self, qubit):
+        if self._tableau is not None:
+            # A random number is drawn even if the outcome is determined, as it is for a state vector
+            self._bit = self._tableau.measure(qubit, random.uniform(0, 1))
+            return
+        self._flush()
+        bit_position = self._num_qubits - qubit
         # Determine probabilities for each measurement
-        zero_probability = sum((abs(x) ** 2 for i, x in enumerate(self._state_vector) if binary_values[i][qubit - 1] == 0))  # type: ignore
-        one_probability = sum((abs(x) ** 2 for i, x in enumerate(self._state_vector) if binary_values[i][qubit - 1] == 1))  # type: ignore
+        if isinstance(self._state_vector, np.memmap):
+            zero_norm, one_norm = 0.0, 0.0
+            for block, (local_bit,) in blocks(
+                self._state_vector, (bit_position,), QuantumState.chunk_qubits, write=False
+            ):
+                block_zero_norm, block_one_norm = probabilities(block, local_bit)
+                zero_norm += block_zero_norm
+                one_norm += block_one_norm
+        else:
+            zero_norm, one_norm = probabilities(self._state_vector, bit_position)
         # Dividing each probability by their sum gets the sum of both resulting probabilities (closer) to 1
-        sum_of_probabilities = zero_probability + one_probability
-        zero_probability = round(zero_probability / sum_of_probabilities, QuantumState.decimal_places)  # type: ignore
-        one_probability = round(one_probability / sum_of_probabilities, QuantumState.decimal_places)  # type: ignore
-        # Collapse the state vector
+        sum_of_probabilities = zero_norm + one_norm
+        zero_probability = round(zero_norm / sum_of_probabilities, self._decimal_places())  # type: ignore
+        # Collapse (and normalise) the state vector in place, and save the measured bit
         rand = random.uniform(0, 1)
         if rand <= zero_probability:
-            self._state_vector = collapsed_zero
             bit = 0
+            scale = 1 / math.sqrt(zero_norm)
         else:
-            self._state_vector = collapsed_one
             bit = 1
-        # Normalise the state vector and save the measured bit
-        self._state_vector = self._state_vector / np.linalg.norm(self._state_vector)
+            scale = 1 / math.sqrt(one_norm)
+        if isinstance(self._state_vector, np.memmap):
+            for block, (local_bit,) in blocks(
+                self._state_vector, (bit_position,), QuantumState.chunk_qubits
+            ):
+                collapse(block, local_bit, bit, scale)
+        else:
+            collapse(self._state_vector, bit_position, bit, scale)
         self._bit = bit
 
+    def apply(self, ops):
+        """
+        Apply a sequence of operations to the quantum state, without validating them.
+
+        Each operation is a tuple of a gate name followed by its arguments, such as ('H', 1), ('CNOT', 1, 2), ('RX', 1, 0.5), ('f2', 1, 2, 'bal0') or ('measure', 1).
+        The checks made by the individual gate methods are skipped, so this is only intended for operations that are already known to be valid.
+        """
+        for name, *args in ops:
+            if name in _single_gates:
+                self._apply(_gate_op(name, args[0]), name)
+                self._record(name, args[0])
+            elif name in _rotation_gates:
+                self._apply(
+                    ("gate", (args[0],), _rotation_gates[name].matrix(*args[1:]))
+                )
+                self._record(name, args[0])
+            elif name in _controlled_gates:
+                self._apply(_gate_op(name, args[0], args[1]), name)
+                self._record(name, args[0], args[1])
+            elif name == "f2":
+                if args[2] != "const0":
+                    self._apply(f2_op(args[2], args[0], args[1]))
+                self._record("f2", args[0], args[1])
+            elif name == "SWAP":
+                self._apply(("swap", (args[0], args[1]), None))
+                self._record("SWAP", args[0], args[1])
+            elif name == "measure":
+                self._apply_measure(args[0])
+                self._record("measure", args[0], self._bit)
+            else:
+                raise PyQubitsError(f"'{name}' is not a valid operation")
+        return self
+
     @validate_qubits
     def measure(self, qubit: int):
         """
         Measure a `qubit` within the quantum state.
         """
         self._apply_measure(qubit)
-        self._update_circuit(qubit, [[str(self._bit)]])
+        self._record("measure", qubit, self._bit)
         return self
 
     @validate_qubits
@@ -458,8 +911,8 @@ class QuantumState:
         """
         Apply the X gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=X.matrix())
-        self._update_circuit(qubit, X.gate())
+        self._apply(("flip", (qubit,), 1))
+        self._record("X", qubit)
         return self
 
     @validate_qubits
@@ -467,8 +920,8 @@ class QuantumState:
         """
         Apply the Y gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=Y.matrix())
-        self._update_circuit(qubit, Y.gate())
+        self._apply_gate(qubit, gate=_gate_matrices["Y"], name="Y")
+        self._record("Y", qubit)
         return self
 
     @validate_qubits
@@ -476,8 +929,8 @@ class QuantumState:
         """
         Apply the Z gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=Z.matrix())
-        self._update_circuit(qubit, Z.gate())
+        self._apply_gate(qubit, gate=_gate_matrices["Z"], name="Z")
+        self._record("Z", qubit)
         return self
 
     @validate_qubits
@@ -485,8 +938,8 @@ class QuantumState:
         """
         Apply the H gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=H.matrix())
-        self._update_circuit(qubit, H.gate())
+        self._apply_gate(qubit, gate=_gate_matrices["H"], name="H")
+        self._record("H", qubit)
         return self
 
     @validate_qubits
@@ -494,8 +947,8 @@ class QuantumState:
         """
         Apply the P gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=P.matrix())
-        self._update_circuit(qubit, P.gate())
+        self._apply_gate(qubit, gate=_gate_matrices["P"], name="P")
+        self._record("P", qubit)
         return self
 
     @validate_qubits
@@ -503,8 +956,48 @@ class QuantumState:
         """
         Apply the T gate to a `qubit` within the quantum state.
         """
-        self._apply_gate(qubit, gate=T.matrix())
-        self._update_circuit(qubit, T.gate())
+        self._apply_gate(qubit, gate=_gate_matrices["T"], name="T")
+        self._record("T", qubit)
+        return self
+
+    @validate_qubits
+    def RX(self, qubit: int, theta: float):
+        """
+        Apply the RX gate (a rotation by `theta` radians around the X axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RX.matrix(theta))
+        self._record("RX", qubit)
+        return self
+
+    @validate_qubits
+    def RY(self, qubit: int, theta: float):
+        """
+        Apply the RY gate (a rotation by `theta` radians around the Y axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RY.matrix(theta))
+        self._record("RY", qubit)
+        return self
+
+    @validate_qubits
+    def RZ(self, qubit: int, theta: float):
+        """
+        Apply the RZ gate (a rotation by `theta` radians around the Z axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RZ.matrix(theta))
+        self._record("RZ", qubit)
+        return self
+
+    @validate_qubits
+    def U3(self, qubit: int, theta: float, phi: float, lam: float):
+        """
+        Apply the U3 gate (a general single qubit rotation, by the angles `theta`, `phi` and `lam`) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta, phi, lam)
+        self._apply_gate(qubit, gate=U3.matrix(theta, phi, lam))
+        self._record("U3", qubit)
         return self
 
     @validate_qubits
@@ -515,8 +1008,8 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CNOT.matrix())
-        self._update_circuit(min(control, target), CNOT.gate(control, target))
+        self._apply(("flip", (control, target), 1))
+        self._record("CNOT", control, target)
         return self
 
     @validate_qubits
@@ -527,8 +1020,8 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CY.matrix())
-        self._update_circuit(min(control, target), CY.gate(control, target))
+        self._apply_cgate(control, target, _gate_matrices["CY"], name="CY")
+        self._record("CY", control, target)
         return self
 
     @validate_qubits
@@ -539,8 +1032,8 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CZ.matrix())
-        self._update_circuit(min(control, target), CZ.gate(control, target))
+        self._apply_cgate(control, target, _gate_matrices["CZ"], name="CZ")
+        self._record("CZ", control, target)
         return self
 
     @validate_qubits
@@ -551,8 +1044,8 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CH.matrix())
-        self._update_circuit(min(control, target), CH.gate(control, target))
+        self._apply_cgate(control, target, _gate_matrices["CH"], name="CH")
+        self._record("CH", control, target)
         return self
 
     @validate_qubits
@@ -563,8 +1056,8 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CP.matrix())
-        self._update_circuit(min(control, target), CP.gate(control, target))
+        self._apply_cgate(control, target, _gate_matrices["CP"], name="CP")
+        self._record("CP", control, target)
         return self
 
     @validate_qubits
@@ -575,32 +1068,80 @@ class QuantumState:
         if control == target:
             raise PyQubitsError("'control' and 'target' cannot be the same")
 
-        self._apply_cgate(control, target, CT.matrix())
-        self._update_circuit(min(control, target), CT.gate(control, target))
+        self._apply_cgate(control, target, _gate_matrices["CT"], name="CT")
+        self._record("CT", control, target)
         return self
 
     @validate_qubits
     def f2(self, qubit1: int, qubit2: int, f: str):
-        if qubit1 + 1 != qubit2:
-            raise PyQubitsError("'qubit1' must be one less than 'qubit2'")
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
         if not f in ["const0", "const1", "bal0", "bal1"]:
             raise PyQubitsError(f"invalid choice of 'f'")
 
-        self._apply_gate(qubit1, qubit2, gate=f2.matrix(f))
-        self._update_circuit(qubit1, f2.gate())
+        # The const0 oracle is the identity, so nothing is applied
+        if f != "const0":
+            self._apply(f2_op(f, qubit1, qubit2))
+        self._record("f2", qubit1, qubit2)
         return self
 
     @validate_qubits
     def SWAP(self, qubit1: int, qubit2: int):
         """
         Apply the SWAP gate to `qubit1` and `qubit2` within the quantum state.
-
-        The SWAP gate is (currently) implemented through CNOT gates.
         """
         if qubit1 == qubit2:
             raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
 
-        self.CNOT(qubit1, qubit2)
-        self.CNOT(qubit2, qubit1)
-        self.CNOT(qubit1, qubit2)
+        self._apply(("swap", (qubit1, qubit2), None))
+        self._record("SWAP", qubit1, qubit2)
+        return self
+
+    def permute_qubits(self, order):
+        """
+        Reorder the qubits of the quantum state, so that qubit `order[i]` becomes qubit `i + 1`.
+
+        The state vector is reordered in a single transpose (and copy), rather than through a sequence of SWAP gates.
+        """
+        validate_qubit_list(order, self._num_qubits)
+        if len(order) != self._num_qubits:
+            raise PyQubitsError("'order' must contain every qubit in the state")
+        # The permutation as a sequence of SWAP gates, which is how it is drawn on the circuit
+        layout = list(range(1, self._num_qubits + 1))
+        swaps = []
+        for position, qubit in enumerate(order, start=1):
+            current = layout.index(qubit, position - 1) + 1
+            if current != position:
+                swaps.append((position, current))
+                layout[position - 1], layout[current - 1] = qubit, layout[position - 1]
+        if self._tableau is not None or isinstance(self._state_vector, np.memmap):
+            # A tableau swaps its columns, and a state stored in a file is streamed through each swap
+            for qubit1, qubit2 in swaps:
+                self._apply(("swap", (qubit1, qubit2), None))
+        else:
+            self._flush()
+            view = self._state_vector.reshape((2,) * self._num_qubits)
+            self._state_vector = np.ascontiguousarray(
+                view.transpose([qubit - 1 for qubit in order])
+            ).reshape(-1)
+        for qubit1, qubit2 in swaps:
+            self._record("SWAP", qubit1, qubit2)
+        return self
+
+    def apply_unitary(self, matrix, qubits):
+        """
+        Apply a custom gate, given by a unitary `matrix` (or an already validated `Unitary` gate), to a list of `qubits` within the quantum state.
+
+        The qubits can be in any order, and need not be adjacent, with the first as the most significant qubit of the matrix.
+        """
+        if not isinstance(matrix, Unitary):
+            matrix = Unitary(matrix)
+        validate_qubit_list(qubits, self._num_qubits)
+        if len(qubits) != matrix.num_qubits:
+            raise PyQubitsError(
+                "'matrix' must act on the same number of qubits as given"
+            )
+
+        self._apply(("gate", tuple(qubits), matrix.matrix()))
+        self._record("U", min(qubits), max(qubits))
         return self
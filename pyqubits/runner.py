@@ -0,0 +1,116 @@
+import os
+import random
+import multiprocessing
+import numpy as np
+from collections import Counter
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+from pyqubits.utils import PyQubitsError
+from pyqubits.circuit import Circuit
+from pyqubits.quantumstate import QuantumState
+
+
+# Each shot of a program with mid-circuit measurements (and classical feedback) is simulated separately
+# The shots are spread over a pool of processes, which read the initial state from shared memory rather than each receiving a copy
+
+
+def _run_program(program, state):
+    # Run one shot, and return its classical outcome
+    if isinstance(program, Circuit):
+        return "".join(str(bit) for bit in program._run_state(state))
+    return program(state)
+
+
+def _run_shots(program, shots, initial, seed):
+    # Run a number of shots from the `initial` vector, and count their outcomes
+    # The global random number generators (used by measurements) are seeded, and restored afterwards
+    random_state, np_random_state = random.getstate(), np.random.get_state()
+    python_seed, numpy_seed = seed.generate_state(2)
+    random.seed(int(python_seed))
+    np.random.seed(int(numpy_seed))
+    try:
+        outcomes = Counter()
+        for _ in range(shots):
+            state = QuantumState._from_state_vector(initial.copy())
+            # The circuit of each shot is never drawn, so its operations are not logged
+            state._recording = False
+            outcomes[_run_program(program, state)] += 1
+        return outcomes
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+
+
+def _run_shared_shots(program, shots, name, length, dtype, seed):
+    # Run a number of shots, from an initial vector stored in the shared memory block called `name`
+    memory = SharedMemory(name=name)
+    try:
+        initial = np.ndarray((length,), dtype=dtype, buffer=memory.buf)
+        outcomes = _run_shots(program, shots, initial, seed)
+        # The view must be released before the shared memory can be closed
+        del initial
+        return outcomes
+    finally:
+        memory.close()
+
+
+def run_shots(program, shots: int, state=None, processes=None, seed=None):
+    """
+    Run `shots` independent shots of a `program`, and return a dictionary of each classical outcome and its number of occurrences.
+
+    The `program` is either a `Circuit` (whose outcome is the string of its measured bits), or a function that is given a `QuantumState` and returns the outcome of the shot (any hashable value).
+    A function can branch on its measurements, such as by only applying a gate if `state.measure(1).bit == 1`.
+    Every shot starts from a copy of the given `state` (a `QuantumState` or vector).
+    Shots are split over a pool of `processes` (by default, one per CPU), each with an independent random number stream derived from `seed`.
+    The processes import `program`, so a function must be defined at the top level of a module.
+    """
+    if not isinstance(program, Circuit) and not callable(program):
+        raise PyQubitsError("'program' must be either a Circuit or a function")
+    if (not isinstance(shots, int)) or shots < 1:
+        raise PyQubitsError("'shots' must be a positive integer")
+    if state is None:
+        if not isinstance(program, Circuit):
+            raise PyQubitsError("'state' must be given when 'program' is a function")
+        state = QuantumState.from_bits("0" * program._num_qubits)
+    elif not isinstance(state, QuantumState):
+        state = QuantumState.from_vector(state)
+    if isinstance(program, Circuit) and state._num_qubits != program._num_qubits:
+        raise PyQubitsError(
+            "The state must have the same number of qubits as the circuit"
+        )
+    # The caller's state is left as it is (a state on a stabilizer tableau stays on it)
+    vector = state._snapshot()
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, shots))
+    # Split the shots as evenly as possible between the processes
+    counts = [
+        shots // processes + (1 if i < shots % processes else 0)
+        for i in range(processes)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    if processes == 1:
+        return dict(_run_shots(program, shots, vector, seeds[0]))
+    memory = SharedMemory(create=True, size=vector.nbytes)
+    try:
+        np.ndarray(vector.shape, dtype=vector.dtype, buffer=memory.buf)[:] = vector
+        # Worker processes are spawned rather than forked, as forking a process that has run multithreaded kernels is unsafe
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            outcomes = sum(
+                executor.map(
+                    _run_shared_shots,
+                    [program] * processes,
+                    counts,
+                    [memory.name] * processes,
+                    [len(vector)] * processes,
+                    [vector.dtype.str] * processes,
+                    seeds,
+                ),
+                Counter(),
+            )
+    finally:
+        memory.close()
+        memory.unlink()
+    return dict(outcomes)
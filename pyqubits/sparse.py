@@ -0,0 +1,430 @@
+import math
+import random
+import numpy as np
+from pyqubits.utils import (
+    PyQubitsError,
+    validate_qubits,
+    validate_dtype,
+    validate_angles,
+)
+from pyqubits.quantumstate import QuantumState
+from pyqubits.kernels import (
+    apply_single,
+    apply_double,
+    apply_controlled,
+    probabilities,
+    collapse,
+)
+from pyqubits.gates import (
+    X,
+    Y,
+    Z,
+    H,
+    P,
+    T,
+    CNOT,
+    CY,
+    CZ,
+    CH,
+    CP,
+    CT,
+    f2,
+    RX,
+    RY,
+    RZ,
+    U3,
+)
+
+
+# A sparse state stores only its non-zero amplitudes, as a sorted array of basis state indices and an array of their amplitudes
+# A gate only visits the basis states in the support (and those it mixes them with), so its cost grows with the number of non-zero amplitudes rather than 2**n
+
+
+_swap_matrix = np.array(
+    [[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=np.complex128
+)
+
+
+def _lookup(indices, amplitudes, wanted):
+    # The amplitude of each of the `wanted` basis states (zero for those outside of the sorted `indices`)
+    positions = np.minimum(np.searchsorted(indices, wanted), len(indices) - 1)
+    found = indices[positions] == wanted
+    return np.where(found, amplitudes[positions], 0)
+
+
+class SparseState:
+    """
+    A class for simulating multi-qubit states with few non-zero amplitudes.
+
+    Once the fraction of non-zero amplitudes exceeds `fill_ratio`, the state is converted to a (dense) state vector, which every later gate is applied to instead.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_indices",
+        "_amplitudes",
+        "_state_vector",
+        "_fill_ratio",
+        "_dtype",
+        "_bit",
+    )
+    # Fraction of non-zero amplitudes above which a sparse state is converted to a state vector, when not given on construction
+    default_fill_ratio = 0.1
+    # Amplitudes with a magnitude at or below this are treated as zero, and dropped from a sparse state
+    tolerance = 1e-15
+
+    def __init__(self, n: int = 1, fill_ratio=None, dtype=None):
+        if (not isinstance(n, int)) or n < 1:
+            raise PyQubitsError("'n' must be a positive integer")
+        if fill_ratio is None:
+            fill_ratio = SparseState.default_fill_ratio
+        if not isinstance(fill_ratio, (int, float)) or not (0 < fill_ratio <= 1):
+            raise PyQubitsError(
+                "'fill_ratio' must be a number greater than 0 and at most 1"
+            )
+        self._dtype = validate_dtype(
+            QuantumState.default_dtype if dtype is None else dtype
+        )
+        self._num_qubits = n
+        # The state is created as the all zero state (a random state would not be sparse)
+        self._indices = np.zeros(1, dtype=np.int64)
+        self._amplitudes = np.ones(1, dtype=self._dtype)
+        self._state_vector = None
+        self._fill_ratio = fill_ratio
+        self._bit = None
+
+    @classmethod
+    def from_bits(cls, bits: str, fill_ratio=None, dtype=None):
+        """
+        Construct a `SparseState` object from a binary number string.
+        """
+        if not isinstance(bits, str) or len(bits) == 0 or any([not c in "01" for c in bits]):
+            raise PyQubitsError(f"'bits' must be a binary number string")
+        obj = cls(len(bits), fill_ratio=fill_ratio, dtype=dtype)
+        obj._indices[0] = int(bits, base=2)
+        return obj
+
+    def __len__(self):
+        """
+        The number of amplitudes stored (every amplitude, once the state has been converted to a state vector).
+        """
+        if self._state_vector is not None:
+            return len(self._state_vector)
+        return len(self._indices)
+
+    def __repr__(self):
+        return (
+            f"SparseState(num_qubits={self._num_qubits}, "
+            + f"backend='{self.backend}', stored={len(self)})"
+        )
+
+    @property
+    def backend(self):
+        """
+        How the quantum state is currently simulated: 'sparse' (its non-zero amplitudes) or 'vector' (a state vector).
+        """
+        return "sparse" if self._state_vector is None else "vector"
+
+    @property
+    def vector(self):
+        """
+        NumPy array of the (dense) state vector.
+        """
+        if self._state_vector is not None:
+            return self._state_vector
+        vector = np.zeros(2**self._num_qubits, dtype=self._dtype)
+        vector[self._indices] = self._amplitudes
+        return vector
+
+    @property
+    def dtype(self):
+        """
+        NumPy dtype of the amplitudes (either complex64 or complex128).
+        """
+        return self._dtype
+
+    @property
+    def bit(self):
+        """
+        The outcome of the latest measurement of the quantum state.
+        """
+        return self._bit
+
+    def amplitudes(self, threshold: float = 0.0):
+        """
+        Dictionary of the basis states (as binary number strings) and amplitudes, for every amplitude with a probability greater than `threshold`.
+        """
+        if self._state_vector is not None:
+            indices = np.nonzero(np.abs(self._state_vector) ** 2 > threshold)[0]
+            amplitudes = self._state_vector[indices]
+        else:
+            keep = np.abs(self._amplitudes) ** 2 > threshold
+            indices, amplitudes = self._indices[keep], self._amplitudes[keep]
+        return {
+            bin(i)[2:].zfill(self._num_qubits): amp
+            for i, amp in zip(indices, amplitudes)
+        }
+
+    def to_state(self):
+        """
+        A `QuantumState` with the same state vector.
+        """
+        return QuantumState.from_vector(self.vector, dtype=self._dtype)
+
+    def _densify(self):
+        self._state_vector = self.vector
+        self._indices = None
+        self._amplitudes = None
+
+    def _apply_sparse(self, gate, bits, control_bit=None):
+        # Apply a gate to the support, mixing each group of basis states that differ only in the gate's bits
+        indices, amplitudes = self._indices, self._amplitudes
+        if control_bit is not None:
+            # Only the basis states where the control bit is one are changed
+            active = ((indices >> control_bit) & 1) == 1
+            unchanged = indices[~active], amplitudes[~active]
+            indices, amplitudes = indices[active], amplitudes[active]
+        if len(indices) > 0:
+            mask = sum(1 << bit for bit in bits)
+            # The first of the gate's bits is the most significant bit of each group's position
+            offsets = [
+                sum(
+                    ((j >> (len(bits) - 1 - k)) & 1) << bit
+                    for k, bit in enumerate(bits)
+                )
+                for j in range(2 ** len(bits))
+            ]
+            bases = np.unique(indices & ~mask)
+            grouped = np.stack(
+                [_lookup(indices, amplitudes, bases | offset) for offset in offsets]
+            )
+            indices = np.concatenate([bases | offset for offset in offsets])
+            amplitudes = (gate @ grouped).reshape(-1)
+            keep = np.abs(amplitudes) > SparseState.tolerance
+            indices, amplitudes = indices[keep], amplitudes[keep]
+        if control_bit is not None:
+            indices = np.concatenate([unchanged[0], indices])
+            amplitudes = np.concatenate([unchanged[1], amplitudes])
+        order = np.argsort(indices, kind="stable")
+        self._indices = indices[order]
+        self._amplitudes = amplitudes[order].astype(self._dtype, copy=False)
+        if len(self._indices) > self._fill_ratio * 2**self._num_qubits:
+            self._densify()
+
+    def _apply_gate(self, *args, gate):
+        gate = np.asarray(gate, dtype=self._dtype)
+        bits = [self._num_qubits - qubit for qubit in args]
+        if self._state_vector is None:
+            self._apply_sparse(gate, bits)
+        elif len(bits) == 1:
+            apply_single(self._state_vector, gate, *bits)
+        else:
+            apply_double(self._state_vector, gate, *bits)
+
+    def _apply_cgate(self, control, target, gate):
+        gate = np.asarray(gate, dtype=self._dtype)
+        control_bit = self._num_qubits - control
+        target_bit = self._num_qubits - target
+        if self._state_vector is None:
+            self._apply_sparse(gate, [target_bit], control_bit=control_bit)
+        else:
+            apply_controlled(self._state_vector, gate, control_bit, target_bit)
+
+    def _apply_measure(self, qubit):
+        bit_position = self._num_qubits - qubit
+        if self._state_vector is None:
+            ones = ((self._indices >> bit_position) & 1) == 1
+            norms = np.abs(self._amplitudes) ** 2
+            zero_norm, one_norm = float(norms[~ones].sum()), float(norms[ones].sum())
+        else:
+            zero_norm, one_norm = probabilities(self._state_vector, bit_position)
+        zero_probability = zero_norm / (zero_norm + one_norm)
+        rand = random.uniform(0, 1)
+        bit = 0 if rand <= zero_probability else 1
+        scale = 1 / math.sqrt(zero_norm if bit == 0 else one_norm)
+        if self._state_vector is None:
+            keep = ones if bit == 1 else ~ones
+            self._indices = self._indices[keep]
+            self._amplitudes = self._amplitudes[keep] * scale
+        else:
+            collapse(self._state_vector, bit_position, bit, scale)
+        self._bit = bit
+
+    @validate_qubits
+    def measure(self, qubit: int):
+        """
+        Measure a `qubit` within the quantum state.
+        """
+        self._apply_measure(qubit)
+        return self
+
+    @validate_qubits
+    def X(self, qubit: int):
+        """
+        Apply the X gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=X.matrix())
+        return self
+
+    @validate_qubits
+    def Y(self, qubit: int):
+        """
+        Apply the Y gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=Y.matrix())
+        return self
+
+    @validate_qubits
+    def Z(self, qubit: int):
+        """
+        Apply the Z gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=Z.matrix())
+        return self
+
+    @validate_qubits
+    def H(self, qubit: int):
+        """
+        Apply the H gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=H.matrix())
+        return self
+
+    @validate_qubits
+    def P(self, qubit: int):
+        """
+        Apply the P gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=P.matrix())
+        return self
+
+    @validate_qubits
+    def T(self, qubit: int):
+        """
+        Apply the T gate to a `qubit` within the quantum state.
+        """
+        self._apply_gate(qubit, gate=T.matrix())
+        return self
+
+    @validate_qubits
+    def RX(self, qubit: int, theta: float):
+        """
+        Apply the RX gate (a rotation by `theta` radians around the X axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RX.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RY(self, qubit: int, theta: float):
+        """
+        Apply the RY gate (a rotation by `theta` radians around the Y axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RY.matrix(theta))
+        return self
+
+    @validate_qubits
+    def RZ(self, qubit: int, theta: float):
+        """
+        Apply the RZ gate (a rotation by `theta` radians around the Z axis) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta)
+        self._apply_gate(qubit, gate=RZ.matrix(theta))
+        return self
+
+    @validate_qubits
+    def U3(self, qubit: int, theta: float, phi: float, lam: float):
+        """
+        Apply the U3 gate (a general single qubit rotation, by the angles `theta`, `phi` and `lam`) to a `qubit` within the quantum state.
+        """
+        validate_angles(theta, phi, lam)
+        self._apply_gate(qubit, gate=U3.matrix(theta, phi, lam))
+        return self
+
+    @validate_qubits
+    def CNOT(self, control: int, target: int):
+        """
+        Apply the CNOT (controlled-X) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CNOT.matrix())
+        return self
+
+    @validate_qubits
+    def CY(self, control: int, target: int):
+        """
+        Apply the CY (controlled-Y) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CY.matrix())
+        return self
+
+    @validate_qubits
+    def CZ(self, control: int, target: int):
+        """
+        Apply the CZ (controlled-Z) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CZ.matrix())
+        return self
+
+    @validate_qubits
+    def CH(self, control: int, target: int):
+        """
+        Apply the CH (controlled-H) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CH.matrix())
+        return self
+
+    @validate_qubits
+    def CP(self, control: int, target: int):
+        """
+        Apply the CP (controlled-P) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CP.matrix())
+        return self
+
+    @validate_qubits
+    def CT(self, control: int, target: int):
+        """
+        Apply the CT (controlled-T) gate to a `control` qubit and `target` qubit within the quantum state.
+        """
+        if control == target:
+            raise PyQubitsError("'control' and 'target' cannot be the same")
+
+        self._apply_cgate(control, target, CT.matrix())
+        return self
+
+    @validate_qubits
+    def f2(self, qubit1: int, qubit2: int, f: str):
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+        if not f in ["const0", "const1", "bal0", "bal1"]:
+            raise PyQubitsError(f"invalid choice of 'f'")
+
+        self._apply_gate(qubit1, qubit2, gate=f2.matrix(f))
+        return self
+
+    @validate_qubits
+    def SWAP(self, qubit1: int, qubit2: int):
+        """
+        Apply the SWAP gate to `qubit1` and `qubit2` within the quantum state.
+        """
+        if qubit1 == qubit2:
+            raise PyQubitsError("'qubit1' and 'qubit2' cannot be the same")
+
+        self._apply_gate(qubit1, qubit2, gate=_swap_matrix)
+        return self
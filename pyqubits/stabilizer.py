@@ -0,0 +1,188 @@
+import numpy as np
+from pyqubits.kernels import apply_observable
+
+
+# A stabilizer state of n qubits is described by a tableau of 2n Pauli strings (as in Aaronson and Gottesman's CHP simulator)
+# The first n rows are the destabilizers, the next n rows are the stabilizers (which the state is the +1 eigenstate of), and the last row is scratch space
+# Each row stores which qubits it flips (x), which qubits it adds a sign to (z), and its overall sign (r)
+# Clifford gates and measurements only update the tableau, so they take polynomial (rather than exponential) time and memory
+
+
+# The Clifford gates the tableau can apply, by name (X, CNOT and SWAP usually arrive as flip and swap operations instead)
+_cliffords = {"X", "Y", "Z", "H", "P", "CNOT", "CY", "CZ"}
+
+
+class Tableau:
+    """
+    A stabilizer tableau, for simulating a classical state acted on by Clifford gates (X, Y, Z, H, P, CNOT, CY, CZ and SWAP) and measurements.
+
+    The tableau only describes the state up to a global phase, so the equivalent state vector (built when a non-Clifford gate is applied) has its first non-zero amplitude real and positive.
+    """
+
+    __slots__ = (
+        "_num_qubits",
+        "_x",
+        "_z",
+        "_r",
+        "dtype",
+    )
+
+    def __init__(self, bits, dtype):
+        n = len(bits)
+        self._num_qubits = n
+        self._x = np.zeros((2 * n + 1, n), dtype=bool)
+        self._z = np.zeros((2 * n + 1, n), dtype=bool)
+        self._r = np.zeros(2 * n + 1, dtype=bool)
+        # The all zero state has destabilizers X and stabilizers Z on each qubit
+        self._x[np.arange(n), np.arange(n)] = True
+        self._z[n + np.arange(n), np.arange(n)] = True
+        self.dtype = np.dtype(dtype)
+        for i, c in enumerate(bits):
+            if c == "1":
+                self._apply_x(i)
+
+    def apply(self, op, name=None):
+        """
+        Apply a gate operation (of the gate called `name`) to the tableau, returning false (and leaving the tableau unchanged) if it is not a Clifford gate.
+
+        Gates are recognised by their name (or the kind of operation), so their matrices are never compared.
+        """
+        kind, qubits, value = op
+        if kind == "flip":
+            # X and CNOT (and the f2 oracles) are flips, where a flip on zero is CNOT between X gates on the control
+            *control, target = (qubit - 1 for qubit in qubits)
+            if not control:
+                self._apply_x(target)
+            elif value == 1:
+                self._apply_cnot(control[0], target)
+            else:
+                self._apply_x(control[0])
+                self._apply_cnot(control[0], target)
+                self._apply_x(control[0])
+        elif kind == "swap":
+            self._apply_swap(qubits[0] - 1, qubits[1] - 1)
+        elif kind in ("gate", "cgate") and name in _cliffords:
+            getattr(self, f"_apply_{name.lower()}")(*(qubit - 1 for qubit in qubits))
+        else:
+            return False
+        return True
+
+    def _apply_x(self, a):
+        self._r ^= self._z[:, a]
+
+    def _apply_y(self, a):
+        self._r ^= self._x[:, a] ^ self._z[:, a]
+
+    def _apply_z(self, a):
+        self._r ^= self._x[:, a]
+
+    def _apply_h(self, a):
+        self._r ^= self._x[:, a] & self._z[:, a]
+        self._x[:, a], self._z[:, a] = self._z[:, a].copy(), self._x[:, a].copy()
+
+    def _apply_p(self, a):
+        self._r ^= self._x[:, a] & self._z[:, a]
+        self._z[:, a] ^= self._x[:, a]
+
+    def _apply_cnot(self, a, b):
+        self._r ^= self._x[:, a] & self._z[:, b] & ~(self._x[:, b] ^ self._z[:, a])
+        self._x[:, b] ^= self._x[:, a]
+        self._z[:, a] ^= self._z[:, b]
+
+    def _apply_cz(self, a, b):
+        self._apply_h(b)
+        self._apply_cnot(a, b)
+        self._apply_h(b)
+
+    def _apply_cy(self, a, b):
+        # CY is CNOT with its target rotated by the inverse of P (which is P followed by Z) beforehand, and by P afterwards
+        self._apply_p(b)
+        self._apply_z(b)
+        self._apply_cnot(a, b)
+        self._apply_p(b)
+
+    def _apply_swap(self, a, b):
+        self._x[:, [a, b]] = self._x[:, [b, a]]
+        self._z[:, [a, b]] = self._z[:, [b, a]]
+
+    def _rowsum(self, rows, i):
+        # Multiply each of the `rows` by row `i`, tracking the sign of each product
+        x1, z1 = self._x[i].astype(np.int64), self._z[i].astype(np.int64)
+        x2, z2 = self._x[rows].astype(np.int64), self._z[rows].astype(np.int64)
+        # The power of i that each qubit contributes to the products' signs
+        g = np.where(
+            x1 & z1,
+            z2 - x2,
+            np.where(x1, z2 * (2 * x2 - 1), z1 * x2 * (1 - 2 * z2)),
+        )
+        total = 2 * self._r[rows] + 2 * self._r[i] + g.sum(axis=1)
+        self._r[rows] = (total % 4) == 2
+        self._x[rows] ^= self._x[i]
+        self._z[rows] ^= self._z[i]
+
+    def measure(self, qubit, rand):
+        """
+        Measure a `qubit`, using the uniform random number `rand` to choose the outcome if it is not already determined.
+        """
+        n = self._num_qubits
+        a = qubit - 1
+        anticommuting = np.nonzero(self._x[n : 2 * n, a])[0]
+        if len(anticommuting) > 0:
+            # A stabilizer anticommutes with the measurement, so both outcomes are equally likely
+            p = n + anticommuting[0]
+            rows = np.nonzero(self._x[: 2 * n, a])[0]
+            rows = rows[rows != p]
+            if len(rows) > 0:
+                self._rowsum(rows, p)
+            # The anticommuting stabilizer becomes a destabilizer, and is replaced by the measured Z
+            self._x[p - n] = self._x[p]
+            self._z[p - n] = self._z[p]
+            self._r[p - n] = self._r[p]
+            self._x[p] = False
+            self._z[p] = False
+            self._z[p, a] = True
+            bit = 0 if rand <= 0.5 else 1
+            self._r[p] = bool(bit)
+        else:
+            # The outcome is determined, and is found by combining the stabilizers in the scratch row
+            self._x[2 * n] = False
+            self._z[2 * n] = False
+            self._r[2 * n] = False
+            for i in np.nonzero(self._x[:n, a])[0]:
+                self._rowsum([2 * n], n + i)
+            bit = int(self._r[2 * n])
+        return bit
+
+    def vector(self):
+        """
+        The state vector of the tableau's state, with its first non-zero amplitude real and positive.
+
+        The vector is built by projecting a basis state onto each stabilizer in turn, which takes n passes over the vector.
+        """
+        n = self._num_qubits
+        # The first basis state with a non-zero amplitude is found by measuring each qubit (of the tableau as it is now), choosing zero whenever the outcome is random
+        saved = self._x.copy(), self._z.copy(), self._r.copy()
+        index = 0
+        for qubit in range(1, n + 1):
+            index = (index << 1) | self.measure(qubit, 0.0)
+        self._x, self._z, self._r = saved
+        state = np.zeros(2**n, dtype=self.dtype)
+        state[index] = 1
+        projected = np.empty_like(state)
+        for row in range(n, 2 * n):
+            # Qubit a + 1 is bit n - 1 - a of a basis state index, and a Y on a qubit is stored as both an X and a Z
+            x_mask = sum(1 << (n - 1 - a) for a in np.nonzero(self._x[row])[0])
+            z_mask = sum(1 << (n - 1 - a) for a in np.nonzero(self._z[row])[0])
+            num_y = int(np.count_nonzero(self._x[row] & self._z[row]))
+            weight = (-1 if self._r[row] else 1) * 1j ** (num_y % 4)
+            apply_observable(
+                state,
+                projected,
+                np.asarray([weight], dtype=np.complex128),
+                np.asarray([x_mask], dtype=np.int64),
+                np.asarray([z_mask], dtype=np.int64),
+            )
+            # The projector onto the stabilizer's +1 eigenspace is (I + S) / 2
+            state += projected
+            state /= 2
+        return state / np.linalg.norm(state)
@@ -0,0 +1,66 @@
+import math
+import numpy as np
+from pyqubits.utils import PyQubitsError
+
+
+# Helpers for state vectors that are stored in a file (as a `np.memmap`) rather than in memory
+# The vector is streamed through memory in chunks, and only a few chunks are ever held in memory at once
+
+
+def create_memmap(path, num_classical_states, dtype):
+    """
+    Create a zeroed state vector of length `num_classical_states`, stored in the file at `path`.
+    """
+    return np.memmap(path, dtype=dtype, mode="w+", shape=(num_classical_states,))
+
+
+def open_memmap(path, dtype):
+    """
+    Open the state vector stored in the file at `path`.
+    """
+    vector = np.memmap(path, dtype=dtype, mode="r+")
+    if len(vector) <= 1 or int(math.log2(len(vector))) != math.log2(len(vector)):
+        raise PyQubitsError(
+            "The vector's length must be greater than one, and can only be a power of two"
+        )
+    return vector
+
+
+def blocks(state, bits, chunk_bits, write=True):
+    """
+    Iterate over the `state` in chunks of `2**chunk_bits` amplitudes, yielding each block with the positions of `bits` within it.
+
+    When a bit is outside of a single chunk, the chunks it pairs up are gathered into one (bounded) buffer,
+    so that a kernel applied to the block sees every amplitude it needs. If `write` is true, changes made to the block are written back to the state.
+    """
+    chunk_bits = min(chunk_bits, int(math.log2(len(state))))
+    chunk = 1 << chunk_bits
+    high = sorted(set(bit for bit in bits if bit >= chunk_bits))
+    # Within a block, the high bits sit directly above the bits of a chunk
+    local_bits = tuple(
+        bit if bit < chunk_bits else chunk_bits + high.index(bit) for bit in bits
+    )
+    # The offset of each chunk within a group, for every combination of the high bits
+    offsets = [
+        sum(1 << bit for r, bit in enumerate(high) if (pattern >> r) & 1)
+        for pattern in range(2 ** len(high))
+    ]
+    buffer = np.empty(len(offsets) * chunk, dtype=state.dtype) if high else None
+    for group in range(len(state) >> (chunk_bits + len(high))):
+        # The start of the group, with each of the high bits set to zero
+        base = group << chunk_bits
+        for bit in high:
+            base = ((base >> bit) << (bit + 1)) | (base & ((1 << bit) - 1))
+        if buffer is None:
+            yield np.asarray(state[base : base + chunk]), local_bits
+            continue
+        for i, offset in enumerate(offsets):
+            buffer[i * chunk : (i + 1) * chunk] = state[
+                base + offset : base + offset + chunk
+            ]
+        yield buffer, local_bits
+        if write:
+            for i, offset in enumerate(offsets):
+                state[base + offset : base + offset + chunk] = buffer[
+                    i * chunk : (i + 1) * chunk
+                ]
@@ -1,7 +1,8 @@
 import inspect
+import functools
 import numpy as np
 import numba as nb
-import pyqubits.gates as gates
+from numbers import Real
 
 
 class PyQubitsError(Exception):
@@ -12,36 +13,81 @@ def validate_qubits(method):
     """
     This decorator checks that the integer arguments of a `QuantumState` method (which are assumed to be qubits) are valid.
     """
+    # Find the qubit arguments once, when the method is decorated, rather than on every call
+    arg_names = list(inspect.signature(method).parameters)[1:]
+    arg_types = {
+        x: inspect.signature(method).parameters[x].annotation for x in arg_names
+    }
+    # If the argument type is not an integer, then it is not a qubit argument so can be ignored
+    qubit_positions = [i for i, x in enumerate(arg_names) if arg_types[x] == int]
+    qubit_names = {x for x in arg_names if arg_types[x] == int}
+
+    def validate(name, value, num_qubits):
+        if (not isinstance(value, int)) or (not (1 <= value <= num_qubits)):
+            raise PyQubitsError(
+                f"'{name}' must be a positive integer, less than or equal to the number of qubits in the state"
+            )
 
     # Define the decorated function
+    @functools.wraps(method)
     def wrapped_method(obj, *args, **kwargs):
-        arg_names = list(inspect.signature(method).parameters)[1:]
-        arg_types = {
-            x: inspect.signature(method).parameters[x].annotation for x in arg_names
-        }
-
-        # Turn positional arguments into keyword arguments
-        for name, value in zip(arg_names, args):
-            kwargs[name] = value
-
+        # Validate positional arguments
+        for i in qubit_positions:
+            if i < len(args):
+                validate(arg_names[i], args[i], obj._num_qubits)
         # Validate keyword arguments
         for name, value in kwargs.items():
-            # If the argument type is not an integer, then it is not a qubit argument so can be ignored
-            if arg_types.get(name) == int:
-                if (not isinstance(value, int)) or (
-                    not (1 <= value <= obj._num_qubits)
-                ):
-                    raise PyQubitsError(
-                        f"'{name}' must be a positive integer, less than or equal to the number of qubits in the state"
-                    )
-
-        # Return the original method, with its (now validated) all keyword arguments
-        return method(obj, **kwargs)
+            if name in qubit_names:
+                validate(name, value, obj._num_qubits)
+
+        # Return the original method, with its (now validated) arguments
+        return method(obj, *args, **kwargs)
 
     return wrapped_method
 
 
-@nb.njit(fastmath=True, parallel=True)
+# The precisions that a state vector can be stored with
+DTYPES = (np.dtype("complex64"), np.dtype("complex128"))
+
+
+def validate_dtype(dtype):
+    """
+    Check that `dtype` is a supported precision for a state vector, and return it as a NumPy dtype.
+    """
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        raise PyQubitsError("'dtype' must be either 'complex64' or 'complex128'")
+    if dtype not in DTYPES:
+        raise PyQubitsError("'dtype' must be either 'complex64' or 'complex128'")
+    return dtype
+
+
+def validate_angles(*angles):
+    """
+    Check that every angle (of a rotation gate) is a real number.
+    """
+    for angle in angles:
+        if not isinstance(angle, Real):
+            raise PyQubitsError("Angles must be real numbers")
+
+
+def validate_qubit_list(qubits, num_qubits):
+    """
+    Check that `qubits` is a non-empty sequence of distinct, valid qubits for a state with `num_qubits` qubits.
+    """
+    if not isinstance(qubits, (list, tuple)) or len(qubits) == 0:
+        raise PyQubitsError("'qubits' must be a non-empty list of qubits")
+    for qubit in qubits:
+        if (not isinstance(qubit, int)) or (not (1 <= qubit <= num_qubits)):
+            raise PyQubitsError(
+                "'qubits' must only contain positive integers, less than or equal to the number of qubits in the state"
+            )
+    if len(set(qubits)) != len(qubits):
+        raise PyQubitsError("'qubits' cannot contain the same qubit more than once")
+
+
+@nb.njit(fastmath=True, parallel=True, cache=True)
 def memkron(gates, state, binary_values):
     """
     Apply gate(s) to qubit(s) in the state, without creating an enormous matrix in the process
@@ -56,14 +102,6 @@ def memkron(gates, state, binary_values):
     return new_state
 
 
-# Force compile on import
-memkron(
-    np.asarray([gates.I_matrix]),
-    np.asarray([1.0 + 0.0j, 0.0 + 0.0j]),
-    np.asarray([[0], [1]]),
-)
-
-
 def _cgate(control, target, gate_char):
     """
     Helper function for gate classes.
@@ -0,0 +1,49 @@
+import sys
+import time
+import subprocess
+
+
+# Max time (in seconds) that importing pyqubits should take
+MAX_IMPORT_TIME = 5
+
+
+def import_time():
+    start = time.time()
+    subprocess.run([sys.executable, "-c", "import pyqubits"], check=True)
+    end = time.time()
+    return end - start
+
+
+def test_import_time():
+    assert import_time() < MAX_IMPORT_TIME
+
+
+def test_import_compiles_nothing():
+    # Kernels should only be compiled when they are first used
+    code = "\n".join(
+        [
+            "import numba",
+            "import pyqubits",
+            "import pyqubits.kernels",
+            "import pyqubits.utils",
+            "compiled = [",
+            "    name",
+            "    for module in [pyqubits.kernels, pyqubits.utils]",
+            "    for name, f in vars(module).items()",
+            "    if isinstance(f, numba.core.dispatcher.Dispatcher) and f.signatures",
+            "]",
+            "print(','.join(compiled))",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def main():
+    print(import_time())
+
+
+if __name__ == "__main__":
+    main()
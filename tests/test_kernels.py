@@ -0,0 +1,119 @@
+import pyqubits
+import numpy as np
+from pyqubits.utils import memkron
+from pyqubits.kernels import (
+    apply_single,
+    apply_double,
+    apply_controlled,
+    apply_flip,
+    apply_swap,
+)
+
+
+# Max difference between floats
+TOLERANCE = 1e-12
+
+
+def binary_values(num_qubits):
+    return np.asarray(
+        [[int(x) for x in bin(i)[2:].zfill(num_qubits)] for i in range(2**num_qubits)]
+    )
+
+
+def test_apply_single():
+    for n in range(1, 6):
+        for qubit in range(1, n + 1):
+            state = pyqubits.QuantumState(n)
+            gates = [pyqubits.I_matrix] * n
+            gates[qubit - 1] = pyqubits.H.matrix()
+            expected = np.asarray(
+                memkron(np.asarray(gates), state.vector, binary_values(n))
+            )
+            vector = state.vector.copy()
+            apply_single(vector, pyqubits.H.matrix(), n - qubit)
+            np.testing.assert_allclose(vector, expected, rtol=TOLERANCE)
+
+
+def test_apply_double():
+    for n in range(2, 6):
+        for qubit in range(1, n):
+            state = pyqubits.QuantumState(n)
+            matrix = pyqubits.f2.matrix("bal1")
+            gate_matrix = np.kron(
+                np.kron(np.eye(2 ** (qubit - 1)), matrix), np.eye(2 ** (n - qubit - 1))
+            )
+            expected = gate_matrix @ state.vector
+            vector = state.vector.copy()
+            apply_double(vector, matrix, n - qubit, n - qubit - 1)
+            np.testing.assert_allclose(vector, expected, rtol=TOLERANCE)
+
+
+def test_apply_controlled():
+    for n in range(2, 6):
+        for control in range(1, n + 1):
+            for target in range(1, n + 1):
+                if control != target:
+                    state = pyqubits.QuantumState(n)
+                    gates_a = [pyqubits.I_matrix] * n
+                    gates_b = [pyqubits.I_matrix] * n
+                    gates_a[control - 1] = pyqubits.zero_matrix
+                    gates_b[control - 1] = pyqubits.one_matrix
+                    gates_b[target - 1] = pyqubits.Y.matrix()
+                    expected = np.add(
+                        memkron(np.asarray(gates_a), state.vector, binary_values(n)),
+                        memkron(np.asarray(gates_b), state.vector, binary_values(n)),
+                    )
+                    vector = state.vector.copy()
+                    apply_controlled(
+                        vector, pyqubits.Y.matrix(), n - control, n - target
+                    )
+                    np.testing.assert_allclose(vector, expected, rtol=TOLERANCE)
+
+
+def test_apply_permutations():
+    for n in range(2, 6):
+        for qubit1 in range(1, n + 1):
+            for qubit2 in range(1, n + 1):
+                state = pyqubits.QuantumState(n)
+                if qubit1 == qubit2:
+                    # An uncontrolled flip is the X gate
+                    expected = state.vector.copy()
+                    apply_single(expected, pyqubits.X.matrix(), n - qubit1)
+                    vector = state.vector.copy()
+                    apply_flip(vector, 1, -1, n - qubit1)
+                    np.testing.assert_array_equal(vector, expected)
+                    continue
+                # A flip controlled on one is CNOT, and one controlled on zero is CNOT between two X gates
+                expected = state.vector.copy()
+                apply_controlled(expected, pyqubits.X.matrix(), n - qubit1, n - qubit2)
+                vector = state.vector.copy()
+                apply_flip(vector, 1, n - qubit1, n - qubit2)
+                np.testing.assert_array_equal(vector, expected)
+                expected = state.vector.copy()
+                apply_single(expected, pyqubits.X.matrix(), n - qubit1)
+                apply_controlled(expected, pyqubits.X.matrix(), n - qubit1, n - qubit2)
+                apply_single(expected, pyqubits.X.matrix(), n - qubit1)
+                vector = state.vector.copy()
+                apply_flip(vector, 0, n - qubit1, n - qubit2)
+                np.testing.assert_array_equal(vector, expected)
+                # A swap is the SWAP gate's matrix, in either order
+                expected = state.vector.copy()
+                apply_double(expected, pyqubits.SWAP.matrix(), n - qubit1, n - qubit2)
+                vector = state.vector.copy()
+                apply_swap(vector, None, n - qubit1, n - qubit2)
+                np.testing.assert_array_equal(vector, expected)
+
+
+def test_measure():
+    for n in range(1, 6):
+        for qubit in range(1, n + 1):
+            state = pyqubits.QuantumState(n)
+            vector = state.vector.copy()
+            state.measure(qubit)
+            # Only the amplitudes that agree with the measured bit remain, and are renormalised
+            mask = np.asarray(
+                [(i >> (n - qubit)) & 1 == state.bit for i in range(2**n)]
+            )
+            expected = np.where(mask, vector, 0)
+            expected = expected / np.linalg.norm(expected)
+            np.testing.assert_allclose(state.vector, expected, rtol=TOLERANCE)
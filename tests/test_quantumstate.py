@@ -0,0 +1,740 @@
+import random
+import functools
+import pytest
+import pyqubits
+import pyqubits.fusion
+import numpy as np
+from pyqubits.utils import PyQubitsError
+
+
+def test_sample():
+    state = pyqubits.QuantumState.from_bits("100")
+    assert state.sample(50) == {"100": 50}
+    assert state.sample(50, qubits=[3, 1]) == {"01": 50}
+    np.testing.assert_array_equal(state.sample(5, counts=False), [4] * 5)
+
+
+def test_sample_distribution():
+    state = pyqubits.QuantumState.from_bits("00").H(1).CNOT(1, 2)
+    counts = state.sample(10000, qubits=[2])
+    assert set(counts) == {"0", "1"}
+    assert abs(counts["0"] - 5000) < 500
+    # Sampling must not collapse the state
+    np.testing.assert_allclose(
+        state.vector, np.asarray([1, 0, 0, 1]) / np.sqrt(2), atol=1e-12
+    )
+
+
+def test_sample_invalid():
+    state = pyqubits.QuantumState(2)
+    with pytest.raises(PyQubitsError):
+        state.sample(0)
+    with pytest.raises(PyQubitsError):
+        state.sample(10, qubits=[1, 1])
+    with pytest.raises(PyQubitsError):
+        state.sample(10, qubits=[3])
+
+
+def _random_circuit(state, num_gates, rng):
+    n = state._num_qubits
+    for _ in range(num_gates):
+        name = rng.choice(["X", "Y", "Z", "H", "P", "T", "CNOT", "CH", "CT", "f2"])
+        if name in ["CNOT", "CH", "CT"]:
+            control, target = rng.choice(np.arange(1, n + 1), size=2, replace=False)
+            getattr(state, name)(int(control), int(target))
+        elif name == "f2":
+            qubit = int(rng.integers(1, n))
+            state.f2(qubit, qubit + 1, f="bal1")
+        else:
+            getattr(state, name)(int(rng.integers(1, n + 1)))
+    return state
+
+
+def test_lazy():
+    for n in range(2, 6):
+        eager = pyqubits.QuantumState(n)
+        lazy = pyqubits.QuantumState.from_vector(eager.vector)
+        lazy.lazy = True
+        _random_circuit(eager, 40, np.random.default_rng(n))
+        _random_circuit(lazy, 40, np.random.default_rng(n))
+        assert len(lazy._pending) == 40
+        np.testing.assert_allclose(lazy.vector, eager.vector, atol=1e-12)
+        assert lazy._pending == []
+        assert lazy.circuit == eager.circuit
+
+
+def test_fuse():
+    ops = [
+        ("gate", (1,), pyqubits.H.matrix()),
+        ("gate", (2,), pyqubits.X.matrix()),
+        ("gate", (1,), pyqubits.T.matrix()),
+        ("cgate", (1, 2), pyqubits.X.matrix()),
+        ("cgate", (1, 2), pyqubits.Z.matrix()),
+        ("gate", (1,), pyqubits.H.matrix()),
+    ]
+    fused = pyqubits.fusion.fuse(ops)
+    # The X gate only permutes the basis states, so becomes a flip
+    assert [(kind, qubits) for kind, qubits, _ in fused] == [
+        ("gate", (1,)),
+        ("flip", (2,)),
+        ("cgate", (1, 2)),
+        ("gate", (1,)),
+    ]
+    np.testing.assert_allclose(
+        fused[0][2], pyqubits.T.matrix() @ pyqubits.H.matrix(), atol=1e-12
+    )
+    np.testing.assert_allclose(
+        fused[2][2], pyqubits.Z.matrix() @ pyqubits.X.matrix(), atol=1e-12
+    )
+
+
+def test_circuit():
+    circuit = pyqubits.Circuit(3).H(1).CNOT(1, 2).T(2).T(2).f2(2, 3, f="bal0").CZ(3, 1)
+    for _ in range(5):
+        state = pyqubits.QuantumState(3)
+        expected = pyqubits.QuantumState.from_vector(state.vector)
+        expected.H(1).CNOT(1, 2).T(2).T(2).f2(2, 3, f="bal0").CZ(3, 1)
+        vector = circuit.run(state.vector)
+        np.testing.assert_allclose(vector, expected.vector, atol=1e-12)
+        circuit.run(state)
+        np.testing.assert_allclose(state.vector, expected.vector, atol=1e-12)
+        assert state.circuit == expected.circuit
+
+
+def test_circuit_measure():
+    circuit = pyqubits.Circuit(2).X(1).CNOT(1, 2).measure(2)
+    state = circuit.run(pyqubits.QuantumState.from_bits("00"))
+    assert state.bit == 1
+    np.testing.assert_allclose(state.vector, [0, 0, 0, 1], atol=1e-12)
+    with pytest.raises(PyQubitsError):
+        circuit.run(np.asarray([1, 0, 0, 0]))
+    with pytest.raises(PyQubitsError):
+        circuit.run(pyqubits.QuantumState(3))
+
+
+def test_batch():
+    states = [pyqubits.QuantumState(3) for _ in range(4)]
+    batch = pyqubits.QuantumStateBatch.from_states(states)
+    batch.H(1).CNOT(1, 3).f2(2, 3, f="const1").CT(3, 2).SWAP(1, 2)
+    for i, state in enumerate(states):
+        state.H(1).CNOT(1, 3).f2(2, 3, f="const1").CT(3, 2).SWAP(1, 2)
+        np.testing.assert_allclose(batch.vectors[i], state.vector, atol=1e-12)
+    circuit = pyqubits.Circuit(3).X(2).CH(2, 1)
+    circuit.run(batch)
+    for i, state in enumerate(states):
+        np.testing.assert_allclose(
+            batch.vectors[i], circuit.run(state).vector, atol=1e-12
+        )
+
+
+def test_batch_measure():
+    batch = pyqubits.QuantumStateBatch.from_bits(["00", "10", "01", "11"])
+    batch.CNOT(1, 2).measure(2)
+    np.testing.assert_array_equal(batch.bits, [0, 1, 1, 0])
+    batch = pyqubits.QuantumStateBatch.from_bits(["00"] * 100).H(1).CNOT(1, 2)
+    batch.measure(1).measure(2)
+    assert 0 < batch.bits.sum() < 100
+    np.testing.assert_allclose(np.abs(batch.vectors).sum(axis=1), 1, atol=1e-12)
+
+
+def test_complex64():
+    double = pyqubits.QuantumState(4)
+    single = pyqubits.QuantumState.from_vector(double.vector, dtype="complex64")
+    assert single.dtype == np.complex64
+    for state in [double, single]:
+        state.H(1).CNOT(1, 4).T(3).f2(2, 3, f="bal0").CY(4, 2)
+    pyqubits.Circuit(4).H(2).CP(2, 1).run(double)
+    pyqubits.Circuit(4).H(2).CP(2, 1).run(single)
+    assert single.vector.dtype == np.complex64
+    np.testing.assert_allclose(single.vector, double.vector, atol=1e-6)
+    single.measure(1)
+    assert single.vector.dtype == np.complex64
+    assert abs(np.linalg.norm(single.vector) - 1) < 1e-6
+    assert pyqubits.QuantumState.from_bits("01", dtype="complex64").dtype == np.complex64
+    batch = pyqubits.QuantumStateBatch(2, 3, dtype="complex64").H(1).measure(1)
+    assert batch.dtype == np.complex64
+    assert batch[0].dtype == np.complex64
+    # A batch of states keeps their precision, unless they differ
+    assert pyqubits.QuantumStateBatch.from_states([single]).dtype == np.complex64
+    mixed = pyqubits.QuantumStateBatch.from_states([single, double])
+    assert mixed.dtype == np.complex128
+    with pytest.raises(PyQubitsError):
+        pyqubits.QuantumState(2, dtype="float64")
+
+
+def test_default_dtype():
+    try:
+        pyqubits.QuantumState.default_dtype = "complex64"
+        assert pyqubits.QuantumState(2).dtype == np.complex64
+        assert pyqubits.QuantumState.from_vector([1, 0]).dtype == np.complex64
+    finally:
+        pyqubits.QuantumState.default_dtype = "complex128"
+    assert pyqubits.QuantumState(2).dtype == np.complex128
+
+
+def test_memmap(tmp_path):
+    chunk_qubits = pyqubits.QuantumState.chunk_qubits
+    try:
+        # Use tiny chunks, so that gates on most qubits pair up different chunks
+        pyqubits.QuantumState.chunk_qubits = 2
+        expected = pyqubits.QuantumState.from_bits("q0q1q0")
+        expected.vector.tofile(tmp_path / "state.bin")
+        state = pyqubits.QuantumState.from_file(tmp_path / "state.bin")
+        assert isinstance(state.vector, np.memmap)
+        for s in [state, expected]:
+            s.H(1).CNOT(1, 6).CH(6, 2).CT(1, 2).f2(3, 4, f="bal1").f2(5, 6, f="const1")
+            s.Y(5).SWAP(2, 6)
+        np.testing.assert_allclose(state.vector, expected.vector, atol=1e-12)
+        state.measure(2)
+        assert isinstance(state.vector, np.memmap)
+        assert abs(np.linalg.norm(state.vector) - 1) < 1e-12
+        basis = pyqubits.QuantumState.from_bits("011010", path=tmp_path / "basis.bin")
+        np.testing.assert_allclose(
+            basis.vector, pyqubits.QuantumState.from_bits("011010").vector
+        )
+        # Reading the state a chunk at a time gives the same results as reading it all at once
+        expected = pyqubits.QuantumState._from_state_vector(np.array(state.vector))
+        np.testing.assert_allclose(
+            state.marginal([5, 1, 4]), expected.marginal([5, 1, 4]), atol=1e-12
+        )
+        assert str(state) == str(expected)
+        assert state.amplitudes(0.01) == expected.amplitudes(0.01)
+        assert state.top(5) == expected.top(5)
+    finally:
+        pyqubits.QuantumState.chunk_qubits = chunk_qubits
+
+
+def test_apply():
+    state = pyqubits.QuantumState(3)
+    expected = pyqubits.QuantumState.from_vector(state.vector)
+    state.apply(
+        [("H", 1), ("CNOT", 1, 3), ("f2", 2, 3, "bal0"), ("SWAP", 1, 2), ("CT", 3, 1)]
+    )
+    expected.H(1).CNOT(1, 3).f2(2, 3, f="bal0").SWAP(1, 2).CT(3, 1)
+    np.testing.assert_allclose(state.vector, expected.vector, atol=1e-12)
+    assert state.circuit == expected.circuit
+    with pytest.raises(PyQubitsError):
+        state.apply([("U", 1)])
+
+
+def test_validate_qubits():
+    state = pyqubits.QuantumState(2)
+    for args, kwargs in [((0,), {}), ((3,), {}), ((), {"qubit": 3}), ((1.0,), {})]:
+        with pytest.raises(PyQubitsError):
+            state.H(*args, **kwargs)
+    with pytest.raises(PyQubitsError):
+        state.CNOT(1, target=3)
+    assert pyqubits.QuantumState.H.__doc__.strip().startswith("Apply the H gate")
+
+
+def test_circuit_log():
+    state = pyqubits.QuantumState.from_bits("00").H(1).CNOT(1, 2)
+    assert state.circuit == "1---H---O---\n        |   \n2-------X---"
+    try:
+        unbounded = pyqubits.QuantumState(3)
+        for _ in range(500):
+            unbounded.H(1).CNOT(2, 3)
+        pyqubits.QuantumState.bounded_circuit = True
+        bounded = pyqubits.QuantumState(3)
+        for _ in range(500):
+            bounded.H(1).CNOT(2, 3)
+        assert len(bounded._circuit) <= 2 * (pyqubits.QuantumState.max_visible_circuit // 4 + 1)
+        assert bounded.circuit == unbounded.circuit
+        assert bounded.all_circuit.startswith("1...")
+        pyqubits.QuantumState.record_circuit = False
+        state.X(1)
+        assert state.circuit == "1---H---O---\n        |   \n2-------X---"
+    finally:
+        pyqubits.QuantumState.bounded_circuit = False
+        pyqubits.QuantumState.record_circuit = True
+
+
+def test_from_bits():
+    for bits in ["0", "1", "0110", "1111", "10000000"]:
+        expected = np.zeros(2 ** len(bits))
+        expected[int(bits, base=2)] = 1
+        state = pyqubits.QuantumState.from_bits(bits)
+        np.testing.assert_array_equal(state.vector, expected)
+        assert state.circuit == pyqubits.QuantumState(len(bits)).circuit
+    state = pyqubits.QuantumState.from_bits("1q0q")
+    assert abs(np.linalg.norm(state.vector) - 1) < 1e-12
+    # Only the amplitudes with the first qubit as one and the third qubit as zero can be non-zero
+    for i, amplitude in enumerate(state.vector):
+        if not (i >> 3) & 1 or (i >> 1) & 1:
+            assert amplitude == 0
+    with pytest.raises(PyQubitsError):
+        pyqubits.QuantumState.from_bits("")
+    with pytest.raises(PyQubitsError):
+        pyqubits.QuantumState.from_bits("012")
+
+
+def test_amplitude_views():
+    state = pyqubits.QuantumState.from_vector([0.1, 0, 0.7, 0.1j, 0, 0, 0.7, 0])
+    vector = state.vector
+    assert state.amplitude("010") == vector[2]
+    assert abs(state.probability("011") - abs(vector[3]) ** 2) < 1e-12
+    assert list(state.amplitudes()) == ["000", "010", "011", "110"]
+    assert list(state.amplitudes(threshold=0.1)) == ["010", "110"]
+    assert [bits for bits, _ in state.top(3)][:2] in [["010", "110"], ["110", "010"]]
+    assert len(state.top(100)) == 8
+    with pytest.raises(PyQubitsError):
+        state.amplitude("01")
+
+
+def test_pages():
+    state = pyqubits.QuantumState(5)
+    pages = list(state.pages(page_size=6))
+    assert len(pages) == 6
+    assert pages[0].startswith("=") and all(page.startswith("+") for page in pages[1:])
+    assert sum(page.count("|") for page in pages) == 32
+    assert list(pyqubits.QuantumState.from_bits("01").pages()) == [str(pyqubits.QuantumState.from_bits("01"))]
+
+
+def pauli_matrix(pauli):
+    matrices = {
+        "I": pyqubits.I_matrix,
+        "X": pyqubits.X.matrix(),
+        "Y": pyqubits.Y.matrix(),
+        "Z": pyqubits.Z.matrix(),
+    }
+    matrix = np.ones((1, 1))
+    for c in pauli:
+        matrix = np.kron(matrix, matrices[c])
+    return matrix
+
+
+def test_expectation():
+    rng = np.random.default_rng(0)
+    for n in range(1, 5):
+        state = pyqubits.QuantumState(n)
+        paulis = ["".join(rng.choice(list("IXYZ"), size=n)) for _ in range(40)]
+        for pauli in paulis[:10]:
+            expected = np.vdot(state.vector, pauli_matrix(pauli) @ state.vector).real
+            assert abs(state.expectation(pauli) - expected) < 1e-12
+        hamiltonian = {pauli: float(rng.normal()) for pauli in paulis}
+        expected = sum(
+            c * np.vdot(state.vector, pauli_matrix(p) @ state.vector).real
+            for p, c in hamiltonian.items()
+        )
+        assert abs(state.expectation(hamiltonian) - expected) < 1e-10
+    with pytest.raises(PyQubitsError):
+        state.expectation("ZZ")
+    with pytest.raises(PyQubitsError):
+        state.expectation({"ZZZZ": 1j})
+
+
+def test_marginal():
+    state = pyqubits.QuantumState(4)
+    probabilities = np.abs(state.vector.reshape(2, 2, 2, 2)) ** 2
+    np.testing.assert_allclose(
+        state.marginal([3, 1]), probabilities.sum(axis=(1, 3)).T.reshape(-1), atol=1e-12
+    )
+    np.testing.assert_allclose(state.marginal([1, 2, 3, 4]), probabilities.reshape(-1))
+    with pytest.raises(PyQubitsError):
+        state.marginal([])
+
+
+def test_reduced_density_matrix():
+    state = pyqubits.QuantumState(3)
+    tensor = state.vector.reshape(2, 2, 2)
+    expected = np.einsum("abc,dbe->caed", tensor, tensor.conj()).reshape(4, 4)
+    np.testing.assert_allclose(state.reduced_density_matrix([3, 1]), expected, atol=1e-12)
+    np.testing.assert_allclose(
+        np.diag(state.reduced_density_matrix([2])), state.marginal([2]), atol=1e-12
+    )
+    bell = pyqubits.QuantumState.from_bits("000").H(1).CNOT(1, 2)
+    assert abs(bell.entanglement_entropy([1]) - 1) < 1e-12
+    assert abs(bell.entanglement_entropy([1, 2])) < 1e-12
+    assert abs(bell.entanglement_entropy([3])) < 1e-12
+
+
+def test_noise_trajectories():
+    simulate = pyqubits.simulate_trajectories
+    circuit = pyqubits.Circuit(2).H(1).CNOT(1, 2)
+    flip = pyqubits.Circuit(1).X(1)
+    # Without noise, every trajectory is the ideal state
+    probs = simulate(circuit, pyqubits.NoiseModel(), 3, processes=1, seed=1)
+    assert np.allclose(probs, [0.5, 0, 0, 0.5])
+    # Full amplitude damping after the X gate always decays the qubit back to zero
+    noise = pyqubits.NoiseModel().add(pyqubits.AmplitudeDamping(1), gates=["X"])
+    probs = simulate(flip, noise, 5, processes=1, seed=1)
+    assert np.allclose(probs, [1, 0])
+    # A certain readout error swaps the outcomes of its qubit
+    noise = pyqubits.NoiseModel().add(pyqubits.ReadoutError(1), qubits=[2])
+    probs = simulate(circuit, noise, 2, processes=1, seed=1)
+    assert np.allclose(probs, [0, 0.5, 0.5, 0])
+    # Depolarizing noise approaches the mixed state, and results only depend on the seed
+    noise = pyqubits.NoiseModel().add(pyqubits.Depolarizing(0.75), gates=["X"])
+    probs = simulate(flip, noise, 4000, processes=2, seed=3)
+    assert np.allclose(probs, [0.5, 0.5], atol=0.05)
+    assert np.array_equal(probs, simulate(flip, noise, 4000, processes=2, seed=3))
+    with pytest.raises(PyQubitsError):
+        pyqubits.Depolarizing(2)
+    with pytest.raises(PyQubitsError):
+        pyqubits.NoiseModel().add(pyqubits.Depolarizing(0.1), gates=["Q"])
+    # Noise attached to measurements acts after the collapse
+    noise = pyqubits.NoiseModel().add(pyqubits.Depolarizing(1), gates=["measure"])
+    measure = pyqubits.Circuit(1).measure(1)
+    probs = simulate(measure, noise, 300, processes=1, seed=2)
+    assert probs[1] > 0.5
+
+
+def teleport(state):
+    # Teleport qubit 1 onto qubit 3, correcting qubit 3 from the measured bits
+    state.H(2).CNOT(2, 3).CNOT(1, 2).H(1)
+    m1 = state.measure(1).bit
+    m2 = state.measure(2).bit
+    if m2 == 1:
+        state.X(3)
+    if m1 == 1:
+        state.Z(3)
+    return state.measure(3).bit
+
+
+def test_run_shots():
+    # Teleporting a one always gives a one, whatever the intermediate measurements
+    initial = pyqubits.QuantumState.from_bits("100")
+    assert pyqubits.run_shots(teleport, 50, initial, processes=1) == {1: 50}
+    assert pyqubits.run_shots(teleport, 50, initial, processes=2, seed=4) == {1: 50}
+    # Outcomes only depend on the seed, and every shot is counted
+    circuit = pyqubits.Circuit(2).H(1).CNOT(1, 2).measure(1).measure(2)
+    counts = pyqubits.run_shots(circuit, 400, processes=2, seed=5)
+    assert set(counts) == {"00", "11"} and sum(counts.values()) == 400
+    assert counts == pyqubits.run_shots(circuit, 400, processes=2, seed=5)
+    # The initial state is left unchanged
+    assert initial.probability("100") == 1
+    # A state on a stabilizer tableau stays on it, and operations are still logged afterwards
+    state = pyqubits.QuantumState.from_bits("0" * 20).H(1)
+    assert pyqubits.run_shots(pyqubits.Circuit(20).measure(2), 10, state, processes=2) == {"0": 10}
+    assert state.backend == "stabilizer" and pyqubits.QuantumState.record_circuit
+    with pytest.raises(PyQubitsError):
+        pyqubits.run_shots(teleport, 10)
+
+
+def test_stabilizer():
+    # A large GHZ state stays on the tableau, and its measurements always agree
+    state = pyqubits.QuantumState.from_bits("0" * 200).H(1)
+    for qubit in range(1, 200):
+        state.CNOT(qubit, qubit + 1)
+    assert state.backend == "stabilizer"
+    bits = {state.measure(qubit).bit for qubit in [1, 100, 200]}
+    assert len(bits) == 1 and state.backend == "stabilizer"
+    # Small classical states are simulated with a state vector
+    assert pyqubits.QuantumState.from_bits("0" * 19).backend == "vector"
+    stabilizer_qubits = pyqubits.QuantumState.stabilizer_qubits
+    pyqubits.QuantumState.stabilizer_qubits = 1
+    try:
+        # Random Clifford circuits measure the same bits, and end in the same state (up to a global phase), as a state vector
+        rng = random.Random(0)
+        for trial in range(50):
+            n = rng.randint(2, 5)
+            ops = []
+            for _ in range(30):
+                if rng.random() < 0.5:
+                    ops.append((rng.choice("XYZHP"), rng.randint(1, n)))
+                elif rng.random() < 0.7:
+                    control, target = rng.sample(range(1, n + 1), 2)
+                    name = rng.choice(["CNOT", "CY", "CZ", "SWAP"])
+                    ops.append((name, control, target))
+                else:
+                    ops.append(("measure", rng.randint(1, n)))
+            bits = "".join(rng.choice("01") for _ in range(n))
+            results = []
+            for stabilizer in [True, False]:
+                pyqubits.QuantumState.stabilizer = stabilizer
+                try:
+                    state = pyqubits.QuantumState.from_bits(bits)
+                    random.seed(trial)
+                    state.apply(ops)
+                    measured = [
+                        b
+                        for name, _, b in state._circuit.operations()
+                        if name == "measure"
+                    ]
+                    results.append((measured, state.vector))
+                finally:
+                    pyqubits.QuantumState.stabilizer = True
+            assert results[0][0] == results[1][0]
+            assert abs(np.vdot(results[0][1], results[1][1])) == pytest.approx(1)
+            # The first non-zero amplitude of the densified state is real and positive
+            first = results[0][1][np.nonzero(np.abs(results[0][1]) > 1e-12)[0][0]]
+            assert first.real > 0 and abs(first.imag) < 1e-12
+        # A non-Clifford gate switches to the state vector
+        state = pyqubits.QuantumState.from_bits("10").H(2).CZ(1, 2)
+        assert state.backend == "stabilizer"
+        state.T(1)
+        assert state.backend == "vector"
+        np.testing.assert_allclose(
+            state.vector,
+            np.exp(1j * np.pi / 4) * np.array([0, 0, 1, -1]) / np.sqrt(2),
+            atol=1e-12,
+        )
+    finally:
+        pyqubits.QuantumState.stabilizer_qubits = stabilizer_qubits
+
+
+def test_mps():
+    # Without truncation, an MPS matches the state vector, including gates on distant qubits
+    mps = pyqubits.MPSState(5)
+    state = pyqubits.QuantumState.from_vector(mps.vector)
+    for s in [mps, state]:
+        s.H(1).CNOT(1, 5).CT(4, 2).f2(2, 3, f="bal1").CY(5, 3).SWAP(1, 4).T(3).CH(2, 5)
+    np.testing.assert_allclose(mps.vector, state.vector, atol=1e-12)
+    assert mps.truncation_error < 1e-12
+    assert mps.amplitude("10101") == pytest.approx(state.amplitude("10101"))
+    bit = mps.measure(2).bit
+    assert mps.to_state().marginal([2])[bit] == pytest.approx(1)
+    # A GHZ chain only ever needs bonds of dimension two
+    ghz = pyqubits.MPSState.from_bits("0" * 60).H(1)
+    for qubit in range(1, 60):
+        ghz.CNOT(qubit, qubit + 1)
+    assert max(ghz.bond_dimensions) == 2
+    assert abs(ghz.amplitude("1" * 60)) ** 2 == pytest.approx(0.5)
+    bits = {ghz.measure(qubit).bit for qubit in [1, 30, 60]}
+    assert len(bits) == 1
+    # Capping the bonds truncates (and reports) the entanglement that doesn't fit
+    capped = pyqubits.MPSState.from_bits("0000", max_bond=1).H(1).CNOT(1, 2)
+    assert capped.bond_dimensions == [1, 1, 1]
+    assert capped.truncation_error == pytest.approx(0.5)
+    assert np.linalg.norm(capped.vector) == pytest.approx(1)
+    with pytest.raises(PyQubitsError):
+        pyqubits.MPSState(2, max_bond=0)
+
+
+def test_sparse():
+    # A reversible circuit on a basis state keeps a single non-zero amplitude, however many qubits there are
+    sparse = pyqubits.SparseState.from_bits("1" + "0" * 49)
+    for qubit in range(1, 50):
+        sparse.CNOT(qubit, qubit + 1)
+    sparse.SWAP(1, 50).f2(2, 3, f="bal1").X(4).Z(5).CZ(1, 50)
+    assert sparse.backend == "sparse" and len(sparse) == 1
+    assert sparse.amplitudes() == {"1110" + "1" * 46: 1}
+    # Sparse and dense gates agree, and the state becomes a vector once it is no longer sparse
+    sparse = pyqubits.SparseState.from_bits("0110", fill_ratio=0.5)
+    state = pyqubits.QuantumState.from_vector(sparse.vector)
+    for s in [sparse, state]:
+        s.H(1).CT(1, 3).CNOT(1, 4).SWAP(4, 2).CY(4, 1).f2(2, 3, f="const1").P(1)
+    assert sparse.backend == "sparse"
+    np.testing.assert_allclose(sparse.vector, state.vector, atol=1e-12)
+    for s in [sparse, state]:
+        s.H(2).H(3).CH(2, 4)
+    assert sparse.backend == "vector"
+    np.testing.assert_allclose(sparse.vector, state.vector, atol=1e-12)
+    # Measuring keeps only the matching amplitudes
+    sparse = pyqubits.SparseState(3).H(1).CNOT(1, 3)
+    bit = sparse.measure(3).bit
+    assert sparse.amplitudes() == pytest.approx({f"{bit}0{bit}": 1})
+
+
+def test_phases():
+    # A ladder of diagonal gates on different qubits becomes a single phase operation
+    ops = [
+        ("gate", (1,), pyqubits.H.matrix()),
+        ("cgate", (2, 1), pyqubits.P.matrix()),
+        ("cgate", (3, 1), pyqubits.T.matrix()),
+        ("gate", (2,), pyqubits.Z.matrix()),
+        ("cgate", (3, 2), pyqubits.Z.matrix()),
+        ("cgate", (1, 3), pyqubits.X.matrix()),
+    ]
+    fused = pyqubits.fusion.fuse(ops)
+    assert [(kind, qubits) for kind, qubits, _ in fused] == [
+        ("gate", (1,)),
+        ("phase", (2, 1, 3)),
+        ("flip", (1, 3)),
+    ]
+    assert len(fused[1][2]) == 4
+    # Phase operations give the same states as applying each gate's full matrix
+    state = pyqubits.QuantumState(3)
+    expected = state.vector.copy()
+    for kind, qubits, matrix in ops:
+        full = [np.eye(2)] * 3
+        if kind == "gate":
+            full[qubits[0] - 1] = matrix
+            expected = functools.reduce(np.kron, full) @ expected
+        else:
+            controlled = [np.eye(2)] * 3
+            controlled[qubits[0] - 1] = np.diag([0, 1])
+            controlled[qubits[1] - 1] = matrix
+            full[qubits[0] - 1] = np.diag([1, 0])
+            expected = (
+                functools.reduce(np.kron, full) + functools.reduce(np.kron, controlled)
+            ) @ expected
+    eager = pyqubits.QuantumState.from_vector(state.vector)
+    eager.H(1).CP(2, 1).CT(3, 1).Z(2).CZ(3, 2).CNOT(1, 3)
+    np.testing.assert_allclose(eager.vector, expected, atol=1e-12)
+    circuit = pyqubits.Circuit(3).H(1).CP(2, 1).CT(3, 1).Z(2).CZ(3, 2).CNOT(1, 3)
+    np.testing.assert_allclose(circuit.run(state.vector), expected, atol=1e-12)
+    batch = circuit.run(pyqubits.QuantumStateBatch.from_states([state, state]))
+    np.testing.assert_allclose(batch.vectors[1], expected, atol=1e-12)
+    batch = pyqubits.QuantumStateBatch.from_states([state, state])
+    batch.H(1).CP(2, 1).CT(3, 1).Z(2).CZ(3, 2).CNOT(1, 3)
+    np.testing.assert_allclose(batch.vectors[0], expected, atol=1e-12)
+
+
+def test_permutations():
+    # X-like gates become flips and swaps, which give the same states as their matrices
+    ops = [
+        ("gate", (2,), pyqubits.X.matrix()),
+        ("cgate", (3, 1), pyqubits.CNOT.matrix()),
+        ("gate", (1, 2), pyqubits.f2.matrix("bal1")),
+        ("gate", (2, 3), pyqubits.f2.matrix("const1")),
+        ("gate", (3, 1), pyqubits.SWAP.matrix()),
+    ]
+    assert [pyqubits.fusion.to_permutation(op)[:2] for op in ops] == [
+        ("flip", (2,)),
+        ("flip", (3, 1)),
+        ("flip", (1, 2)),
+        ("flip", (3,)),
+        ("swap", (3, 1)),
+    ]
+    assert pyqubits.fusion.to_permutation(ops[2])[2] == 0
+    state = pyqubits.QuantumState(3)
+    expected = state.vector.copy()
+    for kind, qubits, matrix in ops:
+        bits = tuple(3 - qubit for qubit in qubits)
+        if kind == "cgate":
+            pyqubits.kernels.apply_controlled(expected, matrix, *bits)
+        elif len(bits) == 1:
+            pyqubits.kernels.apply_single(expected, matrix, *bits)
+        else:
+            pyqubits.kernels.apply_double(expected, matrix, *bits)
+    state.X(2).CNOT(3, 1).f2(1, 2, f="bal1").f2(2, 3, f="const1").SWAP(3, 1)
+    np.testing.assert_allclose(state.vector, expected, atol=1e-12)
+    circuit = pyqubits.Circuit(3).X(2).CNOT(3, 1).f2(1, 2, f="bal1")
+    circuit.f2(2, 3, f="const1").SWAP(3, 1)
+    batch = pyqubits.QuantumStateBatch.from_states([state, state])
+    vectors = batch.vectors.copy()
+    np.testing.assert_allclose(
+        circuit.run(vectors[0]), circuit.run(batch).vectors[1], atol=1e-12
+    )
+    # The SWAP gate swaps the qubits' amplitudes, and is drawn with a cross at each end
+    swapped = pyqubits.QuantumState.from_vector(state.vector).SWAP(1, 3)
+    np.testing.assert_allclose(
+        swapped.vector,
+        state.vector.reshape(2, 2, 2).transpose(2, 1, 0).reshape(-1),
+        atol=1e-12,
+    )
+    assert str(swapped.circuit).splitlines()[0].count("x") == 1
+    # Reordering the qubits is a single transpose, but is drawn as SWAP gates
+    order = [3, 1, 4, 2]
+    state = pyqubits.QuantumState(4)
+    permuted = pyqubits.QuantumState.from_vector(state.vector).permute_qubits(order)
+    np.testing.assert_allclose(
+        permuted.vector,
+        state.vector.reshape((2,) * 4).transpose([2, 0, 3, 1]).reshape(-1),
+        atol=1e-12,
+    )
+    swaps = pyqubits.QuantumState.from_vector(state.vector)
+    for name, a, b in permuted._circuit.operations():
+        assert name == "SWAP"
+        swaps.SWAP(a, b)
+    np.testing.assert_allclose(swaps.vector, permuted.vector, atol=1e-12)
+    # A classical state is reordered by its tableau
+    classical = pyqubits.QuantumState.from_bits("1100" + "0" * 16)
+    classical.permute_qubits(order + list(range(5, 21)))
+    assert classical.backend == "stabilizer"
+    assert classical.amplitudes() == pytest.approx({"0101" + "0" * 16: 1})
+    with pytest.raises(PyQubitsError):
+        state.permute_qubits([1, 2])
+
+
+def test_apply_unitary():
+    # A random three qubit unitary, on qubits in any order
+    rng = np.random.default_rng(7)
+    matrix, _ = np.linalg.qr(rng.normal(size=(8, 8)) + 1j * rng.normal(size=(8, 8)))
+    qubits = [4, 1, 3]
+    state = pyqubits.QuantumState(5)
+    tensor = np.moveaxis(state.vector.reshape((2,) * 5), [3, 0, 2], [0, 1, 2])
+    tensor = (matrix @ tensor.reshape(8, -1)).reshape((2,) * 5)
+    expected = np.moveaxis(tensor, [0, 1, 2], [3, 0, 2]).reshape(-1)
+    gate = pyqubits.Unitary(matrix)
+    applied = pyqubits.QuantumState.from_vector(state.vector)
+    applied.apply_unitary(gate, qubits)
+    np.testing.assert_allclose(applied.vector, expected, atol=1e-12)
+    assert str(applied.circuit).splitlines()[0].count("U") == 1
+    circuit = pyqubits.Circuit(5).apply_unitary(matrix, qubits)
+    np.testing.assert_allclose(circuit.run(state.vector), expected, atol=1e-12)
+    batch = pyqubits.QuantumStateBatch.from_states([state, state])
+    np.testing.assert_allclose(
+        batch.apply_unitary(gate, qubits).vectors[1], expected, atol=1e-12
+    )
+    # f2 can act on any two qubits, in either order
+    for qubit1, qubit2 in [(1, 4), (5, 2)]:
+        f2_state = pyqubits.QuantumState.from_vector(state.vector)
+        unitary_state = pyqubits.QuantumState.from_vector(state.vector)
+        f2_state.f2(qubit1, qubit2, f="bal0")
+        unitary_state.apply_unitary(pyqubits.f2.matrix("bal0"), [qubit1, qubit2])
+        np.testing.assert_allclose(f2_state.vector, unitary_state.vector, atol=1e-12)
+        mps = pyqubits.MPSState.from_bits("10110").f2(qubit1, qubit2, f="bal0")
+        dense = pyqubits.QuantumState.from_bits("10110").f2(qubit1, qubit2, f="bal0")
+        np.testing.assert_allclose(mps.vector, dense.vector, atol=1e-12)
+    with pytest.raises(PyQubitsError):
+        pyqubits.Unitary(np.ones((2, 2)))
+    with pytest.raises(PyQubitsError):
+        pyqubits.Unitary(np.eye(3))
+    with pytest.raises(PyQubitsError):
+        state.apply_unitary(gate, [1, 2])
+
+
+def test_gradient():
+    # Rotations by a half turn are the Pauli gates, up to a global phase
+    state = pyqubits.QuantumState(2)
+    for rotation, pauli in [("RX", "X"), ("RY", "Y"), ("RZ", "Z")]:
+        rotated = getattr(pyqubits.QuantumState.from_vector(state.vector), rotation)
+        expected = getattr(pyqubits.QuantumState.from_vector(state.vector), pauli)
+        np.testing.assert_allclose(
+            rotated(2, np.pi).vector, -1j * expected(2).vector, atol=1e-12
+        )
+    np.testing.assert_allclose(
+        pyqubits.U3.matrix(0.3, 0, 0), pyqubits.RY.matrix(0.3), atol=1e-12
+    )
+
+    def build(angles):
+        return (
+            pyqubits.Circuit(3)
+            .H(1)
+            .RX(1, angles[0])
+            .CNOT(1, 2)
+            .RY(2, angles[1])
+            .U3(3, angles[2], angles[3], angles[4])
+            .CZ(2, 3)
+            .RZ(3, angles[5])
+            .CNOT(3, 1)
+            .RX(2, angles[6])
+        )
+
+    observable = {"ZIZ": 0.5, "XYI": -1.0, "IYX": 0.25}
+    angles = [0.1, -0.7, 1.3, 0.4, -2.0, 0.9, 0.25]
+    circuit = build(angles)
+    np.testing.assert_allclose(circuit.parameters, angles)
+    initial = pyqubits.QuantumState(3)
+    vector = initial.vector.copy()
+    gradient = pyqubits.gradient(circuit, observable, initial)
+    np.testing.assert_array_equal(initial.vector, vector)
+
+    def value(angles):
+        return pyqubits.QuantumState.from_vector(
+            build(angles).run(vector)
+        ).expectation(observable)
+
+    # The adjoint gradient matches the parameter shift rule, which is exact for rotation gates
+    shifts = []
+    for i in range(len(angles)):
+        plus = list(angles)
+        minus = list(angles)
+        plus[i] += np.pi / 2
+        minus[i] -= np.pi / 2
+        shifts.append((value(plus) - value(minus)) / 2)
+    np.testing.assert_allclose(gradient, shifts, atol=1e-10)
+    # Changing the angles of a circuit gives the same gradient as building it again
+    circuit.parameters = [0.0] * len(angles)
+    np.testing.assert_allclose(
+        pyqubits.gradient(circuit, observable, initial),
+        pyqubits.gradient(build([0.0] * len(angles)), observable, initial),
+        atol=1e-12,
+    )
+    assert "RX" in str(pyqubits.QuantumState(1).RX(1, 0.5).circuit)
+    with pytest.raises(PyQubitsError):
+        pyqubits.QuantumState(1).RX(1, "0.5")
+    with pytest.raises(PyQubitsError):
+        pyqubits.gradient(pyqubits.Circuit(1).RX(1, 0.5).measure(1), "Z")